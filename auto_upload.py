@@ -11,6 +11,9 @@ import sys
 from pathlib import Path
 from moviepy.editor import VideoFileClip
 import subprocess
+from tiktok_uploader.worker import worker_running, submit_job, wait_for_result
+from tiktok_uploader.probe import ProbeIndex
+from tiktok_uploader.retime import retime
 
 VIDEO_DIR = "VideosDirPath"
 PROCESSED_DIR = "ProcessedVideos"
@@ -18,10 +21,14 @@ USERNAME = "japanese.207"
 MIN_DURATION = 45  # seconds
 MAX_DURATION = 60  # seconds
 TARGET_DURATION = 60  # seconds
+UPLOAD_TIMEOUT = 900  # seconds to wait for the upload worker
 
 
 def get_video_duration(video_path):
-    """Get video duration in seconds"""
+    """Get video duration in seconds, from the probe index when the file is known"""
+    info = ProbeIndex.get().probe(video_path)
+    if info is not None:
+        return info['duration']
     try:
         clip = VideoFileClip(video_path)
         duration = clip.duration
@@ -34,6 +41,9 @@ def get_video_duration(video_path):
 
 def scale_to_60s(input_path, output_path):
     """Scale video to 60 seconds using slow motion"""
+    if retime(input_path, output_path, TARGET_DURATION):
+        print(f"  ✓ Scaled to {TARGET_DURATION}s: {output_path}")
+        return True
     try:
         clip = VideoFileClip(input_path)
         original_duration = clip.duration
@@ -52,7 +62,7 @@ def scale_to_60s(input_path, output_path):
             output_path,
             codec='libx264',
             audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
+            temp_audiofile=f'{output_path}.temp-audio.m4a',  # One per job, runs may overlap
             remove_temp=True,
             fps=30
         )
@@ -68,8 +78,24 @@ def scale_to_60s(input_path, output_path):
         return False
 
 
+def upload_with_worker(video_name, title):
+    """Upload video through the resident worker (cli.py worker)"""
+    job_id = submit_job(USERNAME, video_name, title)
+    result = wait_for_result(job_id, timeout=UPLOAD_TIMEOUT)
+    if result is None:
+        print(f"  ✗ Worker did not answer within {UPLOAD_TIMEOUT}s")
+        return False
+    if result["status"] == "published":
+        print(f"  ✓ Uploaded successfully: {title} ({result['elapsed']}s)")
+        return True
+    print(f"  ✗ Upload failed: {result.get('error') or result.get('status_msg') or result['status']}")
+    return False
+
+
 def upload_video(video_name, title):
     """Upload video to TikTok"""
+    if worker_running():
+        return upload_with_worker(video_name, title)
     try:
         cmd = [
             "python", "cli.py", "upload",
@@ -114,6 +140,9 @@ def main():
     
     print(f"Found {len(video_files)} video(s)")
     print("=" * 60)
+
+    # Unchanged files are read from the index, new ones from their headers, written back once
+    probed = ProbeIndex.get().probe_many([str(video_path) for video_path in video_files])
     
     uploaded_count = 0
     skipped_count = 0
@@ -124,7 +153,8 @@ def main():
         print(f"\n📹 Processing: {video_name}")
         
         # Get duration
-        duration = get_video_duration(str(video_path))
+        info = probed[str(video_path)]
+        duration = info['duration'] if info else get_video_duration(str(video_path))
         if duration is None:
             print(f"  ⚠ Skipped: Cannot read video")
             skipped_count += 1
@@ -1,5 +1,4 @@
 import argparse
-from tiktok_uploader import tiktok, Video
 from tiktok_uploader.basics import eprint
 from tiktok_uploader.Config import Config
 import sys, os
@@ -21,6 +20,7 @@ if __name__ == "__main__":
     upload_parser.add_argument("-yt", "--youtube", help="Enter Youtube URL")
     upload_parser.add_argument("-t", "--title", help="Title of the video", required=True)
     upload_parser.add_argument("-sc", "--schedule", type=int, default=0, help="Schedule time in seconds")
+    upload_parser.add_argument("-pa", "--publish-at", type=int, help="Publish at this Unix time, instead of -sc seconds after the post")
     upload_parser.add_argument("-ct", "--comment", type=int, default=1, choices=[0, 1])
     upload_parser.add_argument("-d", "--duet", type=int, default=0, choices=[0, 1])
     upload_parser.add_argument("-st", "--stitch", type=int, default=0, choices=[0, 1])
@@ -30,6 +30,31 @@ if __name__ == "__main__":
     upload_parser.add_argument("-ai", "--ailabel", type=int, default=0)
     upload_parser.add_argument("-p", "--proxy", default="")
 
+    # Batch subcommand.
+    batch_parser = subparsers.add_parser("batch", help="Upload several videos and publish them in one post request")
+    batch_parser.add_argument("-u", "--users", help="Enter cookie name from login", required=True)
+    batch_parser.add_argument("-v", "--videos", nargs="+", help="Video files in the videos folder", required=True)
+    batch_parser.add_argument("-t", "--titles", nargs="+", help="One title per video, or one title for all of them", required=True)
+    batch_parser.add_argument("-sc", "--schedule", type=int, default=0, help="Schedule time in seconds")
+    batch_parser.add_argument("-vi", "--visibility", type=int, default=0, help="Visibility type: 0 for public, 1 for private")
+    batch_parser.add_argument("-p", "--proxy", default="")
+
+    # Plan subcommand.
+    plan_parser = subparsers.add_parser("plan", help="Upload a backlog of videos now, scheduled over the account's posting slots")
+    plan_parser.add_argument("-u", "--users", help="Enter cookie name from login", required=True)
+    plan_parser.add_argument("-v", "--videos", nargs="+", help="Video files in the videos folder", required=True)
+    plan_parser.add_argument("-t", "--titles", nargs="+", help="One title per video, or one title for all of them", required=True)
+    plan_parser.add_argument("--dry-run", action='store_true', help="Only show the slot each video would get")
+
+    # Worker subcommand.
+    worker_parser = subparsers.add_parser("worker", help="Run a resident upload worker that takes jobs from the spool directory")
+    worker_parser.add_argument("--spool", help="Spool directory (defaults to WORKER_SPOOL_DIR)")
+    worker_parser.add_argument("-c", "--concurrency", type=int, help="Uploads running at the same time across accounts (defaults to TIKTOK_MAX_CONCURRENT_UPLOADS)")
+
+    # Verify subcommand.
+    verify_parser = subparsers.add_parser("verify", help="Check the status of published posts that are not confirmed yet")
+    verify_parser.add_argument("-w", "--watch", action='store_true', help="Keep checking every VERIFY_INTERVAL seconds")
+
     # Show cookies
     show_parser = subparsers.add_parser("show", help="Show users and videos available for system.")
     show_parser.add_argument("-u", "--users", action='store_true', help="Shows all available cookie names")
@@ -44,6 +69,7 @@ if __name__ == "__main__":
         # Name of file to save the session id.
         login_name = args.name
         # Name of file to save the session id.
+        from tiktok_uploader import tiktok
         tiktok.login(login_name)
 
     elif args.subcommand == "upload":
@@ -59,7 +85,9 @@ if __name__ == "__main__":
             eprint("Both -v and -yt flags cannot be used together.")
             sys.exit(1)
 
+        # Only the YouTube path needs moviepy and pytube.
         if args.youtube:
+            from tiktok_uploader import Video
             video_obj = Video(args.youtube, args.title)
             video_obj.is_valid_file_format()
             video = video_obj.source_ref
@@ -73,7 +101,67 @@ if __name__ == "__main__":
                     print(f'[-] {name}')
                 sys.exit(1)
 
-        tiktok.upload_video(args.users, args.video,  args.title, args.schedule, args.comment, args.duet, args.stitch, args.visibility, args.brandorganic, args.brandcontent, args.ailabel, args.proxy)
+        from tiktok_uploader import tiktok
+        from tiktok_uploader.proxies import ProxyPool, upload_with_failover
+        proxies = ProxyPool.get()
+        if not args.proxy and proxies.has_proxies(args.users):
+            # Use the account's proxies from channels_config.json, healthiest first.
+            upload_with_failover(args.users, args.video, args.title, proxies, schedule_time=args.schedule, allow_comment=args.comment, allow_duet=args.duet, allow_stitch=args.stitch, visibility_type=args.visibility, brand_organic_type=args.brandorganic, branded_content_type=args.brandcontent, ai_label=args.ailabel, publish_at=args.publish_at)
+        else:
+            tiktok.upload_video(args.users, args.video,  args.title, args.schedule, args.comment, args.duet, args.stitch, args.visibility, args.brandorganic, args.brandcontent, args.ailabel, args.proxy, publish_at=args.publish_at)
+
+    elif args.subcommand == "batch":
+        if len(args.titles) == 1:
+            args.titles = args.titles * len(args.videos)
+        if len(args.titles) != len(args.videos):
+            eprint("Give either one title for all videos or one title per video.")
+            sys.exit(1)
+
+        from tiktok_uploader import tiktok
+        results = tiktok.upload_batch(args.users, list(zip(args.videos, args.titles)), args.schedule, args.visibility, args.proxy)
+        for result in results:
+            print(f"[{'+' if result['status'] == 'published' else '-'}] {result['video']}: {result['status']}{' (' + result['error'] + ')' if result['error'] else ''}")
+        if any(result["status"] != "published" for result in results):
+            sys.exit(1)
+
+    elif args.subcommand == "plan":
+        if len(args.titles) == 1:
+            args.titles = args.titles * len(args.videos)
+        if len(args.titles) != len(args.videos):
+            eprint("Give either one title for all videos or one title per video.")
+            sys.exit(1)
+
+        import datetime
+        from tiktok_uploader.planner import PostPlanner, run_backlog
+        backlog = [{"users": args.users, "video": video, "title": title} for video, title in zip(args.videos, args.titles)]
+        planner = PostPlanner()
+        if args.dry_run:
+            planned, left = planner.plan(backlog)
+            for job in planned:
+                print(f"[+] {job['video']}: {datetime.datetime.fromtimestamp(job['publish_at']):%Y-%m-%d %H:%M}")
+                planner.release(job["users"], job["publish_at"])
+            for item in left:
+                print(f"[-] {item['video']}: no free slot in the next 10 days")
+        else:
+            reports = run_backlog(backlog, planner)
+            for report in reports:
+                print(f"[{'+' if report['status'] == 'published' else '-'}] {report['video']}: {report['status']}")
+            if any(report["status"] != "published" for report in reports):
+                sys.exit(1)
+
+    elif args.subcommand == "worker":
+        from tiktok_uploader.worker import UploadWorker
+        if UploadWorker(args.spool, max_concurrent=args.concurrency).run() is False:
+            sys.exit(1)
+
+    elif args.subcommand == "verify":
+        import time
+        from tiktok_uploader.verifier import PostVerifier, VERIFY_INTERVAL
+        verifier = PostVerifier.get()
+        print(f"[+] Resolved {verifier.verify_pending()} posts")
+        while args.watch:
+            time.sleep(VERIFY_INTERVAL)
+            print(f"[+] Resolved {verifier.verify_pending()} posts")
 
     elif args.subcommand == "show":
         # if flag is c then show cookie names
@@ -94,6 +182,6 @@ if __name__ == "__main__":
             print("No flag provided. Use -c (show all cookies) or -v (show all videos).")
 
     else:
-        eprint("Invalid subcommand. Use 'login' or 'upload' or 'show'.")
+        eprint("Invalid subcommand. Use 'login' or 'upload' or 'batch' or 'plan' or 'worker' or 'verify' or 'show'.")
 
 
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for cli.py subcommands
+- Runs the imports of each subcommand in a fresh interpreter
+- Reports the time spent over a bare interpreter start
+- Fails if a subcommand loads a heavy module it does not need, or goes over its budget
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+HEAVY_MODULES = ["moviepy", "pytube", "undetected_chromedriver", "selenium", "fake_useragent", "numpy", "yt_dlp"]
+RUNS = 5
+
+# subcommand: (code run in a fresh interpreter, time budget in seconds over a bare start)
+SCENARIOS = {
+    "show": (
+        "import sys, runpy; sys.argv = ['cli.py', 'show', '-u']; runpy.run_path('cli.py', run_name='__main__')",
+        0.3,
+    ),
+    # Runs cli.py upload up to the request itself, upload_video is swapped for a no-op after the
+    # same imports cli.py does (the account has no proxies, so no proxy is probed either).
+    "upload -v": (
+        "import sys, runpy, tempfile; from tiktok_uploader import tiktok; "
+        "tiktok.upload_video = lambda *args, **kwargs: True; "
+        "video = tempfile.NamedTemporaryFile(suffix='.mp4'); "
+        "sys.argv = ['cli.py', 'upload', '-u', 'import_benchmark', '-v', video.name, '-t', 'Benchmark']; "
+        "runpy.run_path('cli.py', run_name='__main__')",
+        1.0,
+    ),
+    "worker": (
+        "from tiktok_uploader.Config import Config; Config.load('./config.txt'); "
+        "from tiktok_uploader.worker import UploadWorker; from tiktok_uploader import tiktok",
+        1.0,
+    ),
+}
+
+_REPORT = "import sys, json; print('MODULES=' + json.dumps(sorted(sys.modules)))"
+
+
+def run(code):
+    """Run code in a fresh interpreter, returns (seconds, loaded module names)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code + "\n" + _REPORT], capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    line = next(l for l in result.stdout.splitlines() if l.startswith("MODULES="))
+    return elapsed, json.loads(line[len("MODULES="):])
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    baseline = min(run("pass")[0] for _ in range(RUNS))
+    print(f"Interpreter start: {baseline * 1000:.0f}ms")
+    print("=" * 60)
+
+    failed = False
+    for name, (code, budget) in SCENARIOS.items():
+        try:
+            samples = [run(code) for _ in range(RUNS)]
+        except RuntimeError as e:
+            print(f"  ⚠ {name}: could not run ({e})")
+            failed = True
+            continue
+        elapsed = min(s[0] for s in samples) - baseline
+        modules = samples[0][1]
+        heavy = [m for m in HEAVY_MODULES if m in modules]
+        ok = not heavy and elapsed <= budget
+        failed = failed or not ok
+        print(f"  {'✓' if ok else '✗'} {name}: {elapsed * 1000:.0f}ms (budget {budget * 1000:.0f}ms)")
+        if heavy:
+            print(f"    heavy modules loaded: {', '.join(heavy)}")
+
+    print("=" * 60)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
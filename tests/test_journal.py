@@ -0,0 +1,59 @@
+import os, json, stat, time
+
+from tiktok_uploader.journal import UploadJournal
+
+
+def open_journal(tmp_path):
+    video = tmp_path / "video.mp4"
+    if not video.exists():
+        video.write_bytes(b"\0" * 1024)
+    return UploadJournal.open("account", str(video), journal_dir=str(tmp_path / "journal"))
+
+
+def test_phases_only_move_forward(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.update("transferred")
+    journal.update("applied")
+    assert journal.reached("applied") and journal.reached("transferred")
+    assert not journal.reached("finished")
+
+
+def test_legacy_journal_phase_is_not_reached(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.set_credentials_expiry()
+    journal.update("created", project_id="1", creation_id="c", credentials={"secret_access_key": "x"})
+    assert not journal.reached("applied")
+
+    resumed = open_journal(tmp_path)
+    assert resumed.get("project_id") == "1"
+    assert "credentials" not in resumed.data
+    assert not resumed.reached("applied")
+
+
+def test_journal_is_private(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.update("applied", video_id="v")
+    assert stat.S_IMODE(os.stat(journal.path).st_mode) == 0o600
+    with open(journal.path) as f:
+        assert json.load(f)["video_id"] == "v"
+
+
+def test_expired_journal_starts_over(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.set_credentials_expiry(time.time() - 1)
+    journal.update("applied", video_id="v")
+    assert open_journal(tmp_path).get("video_id") is None
+    assert not os.path.exists(journal.path)
+
+
+def test_posting_is_kept_until_rewound(tmp_path):
+    journal = open_journal(tmp_path)
+    journal.set_credentials_expiry()
+    journal.update("committed")
+    journal.update("posting")
+    # A crash while the post was in flight leaves it at posting.
+    assert open_journal(tmp_path).reached("posting")
+
+    journal.rewind("committed")
+    resumed = open_journal(tmp_path)
+    assert resumed.reached("committed") and not resumed.reached("posting")
@@ -0,0 +1,38 @@
+import json, multiprocessing
+
+from tiktok_uploader.planner import PostPlanner
+
+
+def planner(tmp_path):
+    return PostPlanner(str(tmp_path / "planned_posts.json"), str(tmp_path / "channels_config.json"))
+
+
+def test_planners_on_one_file_never_share_a_slot(tmp_path):
+    first, second = planner(tmp_path), planner(tmp_path)
+    slots = [p.next_slot("account") for p in (first, second, first, second)]
+    assert len(set(slots)) == 4
+
+
+def test_release_keeps_the_other_planners_claims(tmp_path):
+    first, second = planner(tmp_path), planner(tmp_path)
+    mine = first.next_slot("account")
+    theirs = second.next_slot("account")
+    first.release("account", mine)
+    with open(tmp_path / "planned_posts.json") as f:
+        assert json.load(f) == {"account": [theirs]}
+
+
+def _claim(tmp_path, results):
+    p = planner(tmp_path)
+    results.put([p.next_slot("account") for _ in range(5)])
+
+
+def test_processes_claim_distinct_slots(tmp_path):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_claim, args=(tmp_path, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(10)
+    slots = [slot for _ in processes for slot in results.get(timeout=1)]
+    assert len(slots) == len(set(slots)) == 20
@@ -0,0 +1,91 @@
+import json, struct
+
+import pytest
+
+from tiktok_uploader.probe import ProbeIndex, probe_file, EBML, SEGMENT, INFO, TIMESTAMP_SCALE, DURATION, TRACKS, \
+    TRACK_ENTRY, TRACK_TYPE, CODEC_ID, VIDEO, PIXEL_WIDTH, PIXEL_HEIGHT, CLUSTER
+
+
+def box(kind, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def mvhd(version, timescale, duration):
+    if version == 1:
+        times = struct.pack(">QQIQ", 0, 0, timescale, duration)
+    else:
+        times = struct.pack(">IIII", 0, 0, timescale, duration)
+    return box(b"mvhd", bytes([version, 0, 0, 0]), times, b"\0" * 80)
+
+
+def trak(handler, codec, width=0, height=0):
+    tkhd = box(b"tkhd", b"\0" * 76, struct.pack(">II", width << 16, height << 16))
+    hdlr = box(b"hdlr", b"\0" * 8, handler, b"\0" * 13)
+    stsd = box(b"stsd", struct.pack(">II", 0, 1), struct.pack(">I4s", 16, codec), b"\0" * 8)
+    return box(b"trak", tkhd, box(b"mdia", hdlr, box(b"minf", box(b"stbl", stsd))))
+
+
+def mp4(*moov):
+    return box(b"ftyp", b"isom", b"\0\0\0\0") + box(b"moov", *moov) + box(b"mdat", b"\0" * 64)
+
+
+def element(element_id, *children, size=None):
+    payload = b"".join(children)
+    encoded_id = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    # Sizes as 8-byte vints, all ones is the unknown size of a live stream.
+    size = (1 << 56) | (len(payload) if size is None else size)
+    return encoded_id + size.to_bytes(8, "big") + payload
+
+
+def webm(unknown_size=False):
+    info = element(INFO, element(TIMESTAMP_SCALE, (1000000).to_bytes(3, "big")), element(DURATION, struct.pack(">d", 59500.0)))
+    video = element(TRACK_ENTRY, element(TRACK_TYPE, b"\x01"), element(CODEC_ID, b"V_VP9"),
+        element(VIDEO, element(PIXEL_WIDTH, (1080).to_bytes(2, "big")), element(PIXEL_HEIGHT, (1920).to_bytes(2, "big"))))
+    audio = element(TRACK_ENTRY, element(TRACK_TYPE, b"\x02"), element(CODEC_ID, b"A_OPUS"))
+    segment = [info, element(TRACKS, video, audio), element(CLUSTER, b"\0" * 64)]
+    header = element(EBML, element(0x4282, b"webm"))
+    if unknown_size:
+        return header + element(SEGMENT, *segment, size=(1 << 56) - 1)
+    return header + element(SEGMENT, *segment)
+
+
+def probe_bytes(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return probe_file(str(path))
+
+
+@pytest.mark.parametrize("version, timescale, duration, seconds", [
+    (0, 1000, 61500, 61.5),
+    (1, 1000000, 5000000000, 5000.0),
+])
+def test_mp4(tmp_path, version, timescale, duration, seconds):
+    data = mp4(mvhd(version, timescale, duration), trak(b"vide", b"avc1", 1080, 1920), trak(b"soun", b"mp4a"))
+    info = probe_bytes(tmp_path, "video.mp4", data)
+    assert info == {"container": "mp4", "duration": seconds, "width": 1080, "height": 1920, "vcodec": "avc1", "acodec": "mp4a"}
+
+
+def test_mp4_without_audio(tmp_path):
+    info = probe_bytes(tmp_path, "video.mp4", mp4(mvhd(0, 600, 36000), trak(b"vide", b"hvc1", 720, 1280)))
+    assert info == {"container": "mp4", "duration": 60.0, "width": 720, "height": 1280, "vcodec": "hvc1", "acodec": None}
+
+
+@pytest.mark.parametrize("unknown_size", [False, True])
+def test_webm(tmp_path, unknown_size):
+    info = probe_bytes(tmp_path, "video.webm", webm(unknown_size))
+    assert info == {"container": "matroska", "duration": 59.5, "width": 1080, "height": 1920, "vcodec": "V_VP9", "acodec": "A_OPUS"}
+
+
+def test_removed_file_leaves_the_index(tmp_path):
+    index_path = tmp_path / "cache" / "video_probe.json"
+    index = ProbeIndex(str(index_path))
+    video = tmp_path / "temp_abc_account.mp4"
+    video.write_bytes(mp4(mvhd(0, 1000, 61500), trak(b"vide", b"avc1", 1080, 1920)))
+    assert index.probe(str(video))["duration"] == 61.5
+    assert str(video) in json.loads(index_path.read_text())
+
+    video.unlink()
+    index.forget(str(video))
+    assert index.entries == {}
+    assert json.loads(index_path.read_text()) == {}
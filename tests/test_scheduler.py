@@ -0,0 +1,52 @@
+import json, time, multiprocessing
+
+from tiktok_uploader.scheduler import RateLimiter, BURST, DEFAULT_POSTS_PER_HOUR, RATE_STEP
+
+
+def test_limiters_on_one_file_share_tokens(tmp_path):
+    path = str(tmp_path / "rate_limits.json")
+    first, second = RateLimiter(path), RateLimiter(path)
+    taken = [limiter.acquire("account") for limiter in (first, second, first, second)]
+    assert taken.count(True) == BURST
+
+
+def test_limiters_keep_what_the_others_learned(tmp_path):
+    path = str(tmp_path / "rate_limits.json")
+    first, second = RateLimiter(path), RateLimiter(path)
+    assert first.acquire("a")
+    assert second.acquire("b")
+    first.record("a", {"status": "published"})
+    second.record("b", {"status_msg": "You are posting too fast. Take a rest."})
+
+    with open(path) as f:
+        buckets = json.load(f)
+    assert buckets["a"]["rate"] == DEFAULT_POSTS_PER_HOUR + RATE_STEP
+    assert buckets["b"]["rate"] == DEFAULT_POSTS_PER_HOUR / 2
+    assert buckets["b"]["paused_until"] > time.time()
+    assert first.delay("b") > 0
+
+
+def _acquire_all(path, results):
+    limiter = RateLimiter(path)
+    results.put(sum(limiter.acquire("account") for _ in range(5)))
+
+
+def test_processes_do_not_spend_the_same_token(tmp_path):
+    path = str(tmp_path / "rate_limits.json")
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_acquire_all, args=(path, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(10)
+    assert sum(results.get(timeout=1) for _ in processes) == BURST
+
+
+def test_unanswered_post_keeps_its_token_spent(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "rate_limits.json"))
+    for _ in range(BURST):
+        assert limiter.acquire("account")
+    limiter.record("account", {"status": "unknown"})
+    assert not limiter.acquire("account")
+    limiter.record("account", {"status": "failed"})
+    assert limiter.acquire("account")
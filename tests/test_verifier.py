@@ -0,0 +1,11 @@
+from tiktok_uploader.verifier import PostVerifier
+
+
+def test_verifiers_on_one_file_keep_each_others_posts(tmp_path):
+    path = str(tmp_path / "post_status.json")
+    first, second = PostVerifier(path), PostVerifier(path)
+    first.track("a", "c1", ["v1"])
+    second.track("b", "c2", ["v2"])
+    first.track("a", "c3", ["v3"])
+    assert [PostVerifier(path).status(c) for c in ("c1", "c2", "c3")] == ["pending"] * 3
+    assert not [name for name in (tmp_path).iterdir() if name.suffix == ".tmp"]
@@ -0,0 +1,95 @@
+import socket, time, threading
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from youtube_websub import LocalHub, WebSubReceiver, atom_notification, sign
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def start(on_video):
+    hub = LocalHub(free_port())
+    hub.start()
+    port = free_port()
+    receiver = WebSubReceiver(f"http://127.0.0.1:{port}/", on_video, port=port, hub_url=hub.url)
+    receiver.start(["UCtest"])
+    topic = receiver.topic("UCtest")
+    # The hub keeps the subscriber once the receiver answered its verification
+    assert wait_for(lambda: receiver.subscribed("UCtest") and topic in hub.subscribers)
+    return hub, receiver
+
+
+@pytest.fixture
+def subscribed():
+    calls = []
+    hub, receiver = start(lambda channel_id, video: calls.append((channel_id, video)))
+    yield hub, receiver, calls
+    receiver.stop()
+    hub.stop()
+
+
+def test_video_notified_twice_is_passed_on_once(subscribed):
+    hub, receiver, calls = subscribed
+    payload = atom_notification("UCtest", "dQw4w9WgXcQ")
+    assert hub.publish(receiver.topic("UCtest"), payload) == [204]
+    assert hub.publish(receiver.topic("UCtest"), payload) == [204]
+
+    assert wait_for(lambda: calls)
+    time.sleep(0.3)
+    assert len(calls) == 1
+    channel_id, video = calls[0]
+    assert channel_id == "UCtest"
+    assert video["video_id"] == "dQw4w9WgXcQ"
+
+
+def test_bad_signature_is_ignored(subscribed):
+    hub, receiver, calls = subscribed
+    payload = atom_notification("UCtest", "dQw4w9WgXcQ")
+    r = requests.post(receiver.callback_url, data=payload, timeout=10,
+                      headers={"Content-Type": "application/atom+xml", "X-Hub-Signature": sign("not the secret", payload)})
+    # Answered like any notification, but never passed on
+    assert r.status_code == 204
+    time.sleep(0.3)
+    assert calls == []
+    # Nor remembered, the genuine notification still goes through
+    hub.publish(receiver.topic("UCtest"), payload)
+    assert wait_for(lambda: calls)
+
+
+def test_hub_is_answered_while_the_pipeline_is_full():
+    release, calls = threading.Event(), []
+
+    def on_video(channel_id, video):
+        # Stands for a put on the monitor's full filter queue
+        release.wait(10)
+        calls.append(video["video_id"])
+
+    hub, receiver = start(on_video)
+    try:
+        assert hub.publish(receiver.topic("UCtest"), atom_notification("UCtest", "first")) == [204]
+        # What the handler runs for each notification returns without waiting for on_video
+        payload = atom_notification("UCtest", "second")
+        started = time.time()
+        assert len(receiver.receive(payload, sign(receiver.secret, payload))) == 1
+        assert time.time() - started < 1
+        assert calls == []
+        release.set()
+        assert wait_for(lambda: len(calls) == 2)
+        assert sorted(calls) == ["first", "second"]
+    finally:
+        release.set()
+        receiver.stop()
+        hub.stop()
@@ -0,0 +1,64 @@
+import os, time, threading
+
+from tiktok_uploader import worker
+from tiktok_uploader.storage import try_lock
+from tiktok_uploader.worker import UploadWorker, worker_running
+
+
+def write_heartbeat(spool_dir, pid, age=0):
+    path = os.path.join(spool_dir, "worker.heartbeat")
+    with open(path, "w") as f:
+        f.write(str(pid))
+    os.utime(path, (time.time() - age, time.time() - age))
+
+
+def test_refuses_to_start_next_to_a_live_worker(tmp_path):
+    spool_dir = str(tmp_path)
+    upload_worker = UploadWorker(spool_dir)
+    job = os.path.join(spool_dir, "running", "job.json")
+    with open(job, "w") as f:
+        f.write("{}")
+    write_heartbeat(spool_dir, os.getpid() + 1)
+    other = try_lock(upload_worker.paths["lock"])
+
+    assert upload_worker.run() is False
+    # The other worker's job stays claimed by it.
+    assert os.path.exists(job)
+    assert os.listdir(os.path.join(spool_dir, "jobs")) == []
+    other.close()
+
+
+def test_only_one_worker_holds_the_spool(tmp_path):
+    first, second = UploadWorker(str(tmp_path)), UploadWorker(str(tmp_path))
+    # Both see no heartbeat, only the lock tells them apart.
+    held = try_lock(first.paths["lock"])
+    assert held is not None
+    assert try_lock(second.paths["lock"]) is None
+    held.close()
+    # A worker that exited (or died) leaves the lock free.
+    assert try_lock(second.paths["lock"]) is not None
+
+
+def test_stale_heartbeat_is_not_a_live_worker(tmp_path):
+    spool_dir = str(tmp_path)
+    upload_worker = UploadWorker(spool_dir)
+    write_heartbeat(spool_dir, os.getpid() + 1, age=worker.HEARTBEAT_TIMEOUT + 1)
+    assert upload_worker._live_worker() is None
+    write_heartbeat(spool_dir, os.getpid())
+    assert upload_worker._live_worker() is None
+
+
+def test_heartbeat_is_refreshed_while_a_job_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "HEARTBEAT_INTERVAL", 0.05)
+    spool_dir = str(tmp_path)
+    upload_worker = UploadWorker(spool_dir)
+    upload_worker._heartbeat()
+    os.utime(upload_worker.paths["heartbeat"], (0, 0))
+    assert not worker_running(spool_dir)
+
+    thread = threading.Thread(target=upload_worker._beat, daemon=True)
+    thread.start()
+    time.sleep(0.3)
+    upload_worker._stop.set()
+    thread.join(1)
+    assert worker_running(spool_dir)
@@ -14,7 +14,10 @@ class Config:
         "TMP_YOUTUBE_VIDEO_DIR": "",
         "LANG": "en", 
         "TIKTOK_BASE_URL": "https://www.tiktok.com/upload?lang=", 
-        "IMAGEMAGICK_BINARY": ""
+        "IMAGEMAGICK_BINARY": "",
+        "JOURNAL_DIR": "./UploadJournal",
+        "WORKER_SPOOL_DIR": "./WorkerSpool",
+        "CACHE_DIR": "./CacheDir"
     }
 
     _EXCLUDE = ["#"]
@@ -65,7 +68,8 @@ class Config:
         return line.split("=")[1].strip().replace('"', '')
 
     def get_option_by_name(self, opt_name: str):
-        return self._options.get(opt_name)
+        # Options missing from an older config file fall back to their defaults.
+        return self._options.get(opt_name, Config._DEFAULT_OPTIONS.get(opt_name))
     
     def _insert_option(self, opt_name: str, value):
         self._options[opt_name] = value
@@ -129,3 +133,18 @@ class Config:
     def imagemagick_binary_path(self):
         """ImageMagick Binary path """
         return self.get_option_by_name("IMAGEMAGICK_BINARY")
+
+    @property
+    def journal_dir(self):
+        """Directory where upload journals are kept to resume interrupted uploads"""
+        return self.get_option_by_name("JOURNAL_DIR")
+
+    @property
+    def worker_spool_dir(self):
+        """Directory the upload worker takes jobs from and writes results to"""
+        return self.get_option_by_name("WORKER_SPOOL_DIR")
+
+    @property
+    def cache_dir(self):
+        """Directory for caches kept between runs (resolved tags, upload host stats...)"""
+        return self.get_option_by_name("CACHE_DIR")
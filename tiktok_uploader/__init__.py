@@ -1,6 +1,29 @@
-from .Browser import *
+import importlib
+
 from .cookies import *
 from .Config import *
-from .Video import *
-from .tiktok import *
 from .basics import *
+
+# Browser, Video and the upload API pull in selenium, moviepy, pytube and fake_useragent,
+# so they are only imported the first time they are used.
+_LAZY_ATTRIBUTES = {
+    "Browser": ("Browser", "Browser"),
+    "Video": ("Video", "Video"),
+    "tiktok": ("tiktok", None),
+    "login": ("tiktok", "login"),
+    "upload_video": ("tiktok", "upload_video"),
+    "upload_to_tiktok": ("tiktok", "upload_to_tiktok"),
+    "upload_batch": ("tiktok", "upload_batch"),
+    "UploadBatcher": ("async_upload", "UploadBatcher"),
+    "upload_many": ("async_upload", "upload_many"),
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    module = importlib.import_module(f".{module_name}", __name__)
+    value = getattr(module, attribute) if attribute else module
+    globals()[name] = value
+    return value
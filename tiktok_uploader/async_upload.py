@@ -0,0 +1,144 @@
+import os, time, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from tiktok_uploader import tiktok
+from tiktok_uploader.Config import Config
+from tiktok_uploader.bot_utils import convert_tags
+from tiktok_uploader.journal import UploadJournal
+from tiktok_uploader.planner import schedule_time_for
+from tiktok_uploader.sessions import get_upload_client
+
+
+# Uploads running at the same time for one account, and part transfers sent to one upload host.
+PER_ACCOUNT = int(os.getenv("TIKTOK_ASYNC_PER_ACCOUNT", "1"))
+PER_HOST = int(os.getenv("TIKTOK_ASYNC_PER_HOST", "4"))
+# Threads running the blocking steps (create, auth, apply, finish, commit, tags, post) of every
+# upload in flight, an upload uses at most four of them at once.
+MAX_WORKERS = int(os.getenv("TIKTOK_ASYNC_WORKERS", "32"))
+# Threads sending video parts, shared by every transfer in flight whatever the account.
+PART_WORKERS = int(os.getenv("TIKTOK_ASYNC_PART_WORKERS", "8"))
+
+
+class _StepFailed(Exception):
+	pass
+
+
+class UploadBatcher:
+	"""Batches the upload_video flow of many accounts over two bounded thread pools.
+
+	This is not asynchronous I/O: every step (create, auth, apply, transfer, finish, commit,
+	post...) is the same blocking requests function upload_video uses, run on a thread pool of
+	max_workers threads. The event loop only orders the steps of each upload and enforces the
+	limits: per_account uploads of one account at a time and per_host transfers to one upload
+	host. The parts of every transfer share a single pool of part_workers threads instead of
+	each upload starting a pool of its own, so the thread count is fixed however many accounts
+	are uploading."""
+
+	def __init__(self, per_account=PER_ACCOUNT, per_host=PER_HOST, max_workers=MAX_WORKERS, part_workers=PART_WORKERS):
+		self.per_account = per_account
+		self.per_host = per_host
+		self._executor = ThreadPoolExecutor(max_workers=max_workers)
+		self._part_pool = ThreadPoolExecutor(max_workers=part_workers)
+		self._accounts = {}
+		self._hosts = {}
+
+	def close(self):
+		self._executor.shutdown(wait=True)
+		self._part_pool.shutdown(wait=True)
+
+	def _semaphore(self, table, key, size):
+		if key not in table:
+			table[key] = asyncio.Semaphore(size)
+		return table[key]
+
+	async def _call(self, func, *args):
+		return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+	async def _step(self, timings, name, func, *args):
+		start = time.time()
+		result = await self._call(func, *args)
+		timings[name] = round(time.time() - start, 3)
+		if result is None or result is False:
+			raise _StepFailed(name)
+		return result
+
+	async def upload(self, session_user, video, title, schedule_time=0, allow_comment=1, allow_duet=0, allow_stitch=0, visibility_type=0, brand_organic_type=0, branded_content_type=0, ai_label=0, proxy=None, report=None, publish_at=None):
+		"""upload_video as a coroutine, returns True once the video is published.
+		publish_at (a timestamp) schedules the post at that time, schedule_time is then worked out in post_payload."""
+		report = {} if report is None else report
+		if publish_at:
+			schedule_time = schedule_time_for(publish_at)
+		if not tiktok.validate_upload(title, schedule_time, visibility_type):
+			return False
+
+		async with self._semaphore(self._accounts, session_user, self.per_account):
+			opened = await self._call(tiktok.open_session, session_user, proxy)
+			if opened is None:
+				return False
+			profile, user_agent, session = opened
+			video_path = os.path.join(os.getcwd(), Config.get().videos_dir, video)
+			journal = await self._call(UploadJournal.open, session_user, video_path)
+			upload_client = get_upload_client(session_user, proxy)
+			timings = report.setdefault("timings", {})
+
+			print(f"[+] {session_user}: uploading {video}")
+			start = time.time()
+			# Same ordering as upload_video: the project, the transfer chain, the tags and the
+			# warm-up are independent, only the post needs all of them.
+			results = await asyncio.gather(
+				self._step(timings, "create", tiktok.create_project, session, journal, report),
+				self._transfer(timings, session, upload_client, video_path, journal, report),
+				# Mentions are resolved on the step's own thread rather than on yet another pool.
+				self._step(timings, "tags", convert_tags, title, session, 1),
+				self._step(timings, "warmup", tiktok.warm_up, session, profile, user_agent),
+				return_exceptions=True,
+			)
+			try:
+				for result in results:
+					if isinstance(result, BaseException):
+						raise result
+				project, node, tags, ms_token = results
+				await self._step(
+					timings, "post", tiktok.publish_video, session, profile, journal, user_agent,
+					project[0], node["video_id"], title, tags, ms_token, schedule_time, report, publish_at
+				)
+			except _StepFailed as e:
+				print(f"[-] {session_user}: upload of {video} failed at {e}")
+				report["failed_step"] = str(e)
+				return False
+			finally:
+				report["elapsed"] = round(time.time() - start, 3)
+		return True
+
+	async def _transfer(self, timings, session, upload_client, video_path, journal, report):
+		credentials = await self._step(timings, "auth", tiktok.authorize_upload, session)
+		node = await self._step(timings, "apply", tiktok.apply_upload, session, credentials, video_path, journal, report)
+		async with self._semaphore(self._hosts, node["upload_host"], self.per_host):
+			crcs = await self._step(timings, "transfer", tiktok.transfer_parts, upload_client, video_path, node, journal, self._part_pool)
+		await self._step(timings, "finish", tiktok.finish_upload, session, node, crcs, journal)
+		await self._step(timings, "commit", tiktok.commit_upload, session, credentials, node, journal)
+		return node
+
+	async def upload_all(self, jobs):
+		"""Upload every job concurrently, jobs are {"users", "video", "title", **upload_video options}.
+		Returns one report per job, in order, with a "status" of published, failed, unknown (the post
+		got no answer, PostVerifier settles it) or error."""
+		async def run(job):
+			options = {k: v for k, v in job.items() if k not in ("users", "video", "title")}
+			report = {"users": job["users"], "video": job["video"]}
+			try:
+				ok = await self.upload(job["users"], job["video"], job["title"], report=report, **options)
+				report["status"] = "published" if ok else "unknown" if report.get("status") == "unknown" else "failed"
+			except Exception as e:
+				report["status"], report["error"] = "error", str(e) or e.__class__.__name__
+			return report
+
+		return await asyncio.gather(*[run(job) for job in jobs])
+
+
+def upload_many(jobs, **limits):
+	"""Blocking helper: upload every job on a new event loop, see UploadBatcher.upload_all"""
+	uploader = UploadBatcher(**limits)
+	try:
+		return asyncio.run(uploader.upload_all(jobs))
+	finally:
+		uploader.close()
@@ -1,13 +1,50 @@
-import requests, secrets, string, uuid, zlib, json, re, time, subprocess
+import requests, secrets, string, uuid, zlib, json, re, time, subprocess, os
 from requests_auth_aws_sigv4 import AWSSigV4
+from concurrent.futures import ThreadPoolExecutor
+from tiktok_uploader.tag_cache import TagCache
 
 
 user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 
-def subprocess_jsvmp(js, user_agent, url):
+# Address of the long-lived signer started with `node tiktok-signature/listen.js`.
+SIGNER_URL = os.getenv("SIGNER_URL", "http://127.0.0.1:8080/signature")
+SIGN_TIMEOUT = 30
+
+
+def subprocess_jsvmp(js, user_agent, url, timeout=SIGN_TIMEOUT):
 	proc = subprocess.Popen(['node', js, url, user_agent], stdout=subprocess.PIPE)
-	return proc.stdout.read().decode('utf-8')
+	try:
+		output, _ = proc.communicate(timeout=timeout)
+	except subprocess.TimeoutExpired:
+		proc.kill()
+		proc.communicate()
+		print(f"[-] Signature process timed out after {timeout}s")
+		return None
+	return output.decode('utf-8')
+
+
+def sign_with_daemon(user_agent, url, timeout=SIGN_TIMEOUT):
+	"""Ask the running signer daemon to sign url, returns None if it is not running or fails"""
+	try:
+		r = requests.post(SIGNER_URL, data=json.dumps({"url": url, "user_agent": user_agent}), timeout=(1, timeout))
+	except requests.exceptions.ConnectionError:
+		return None
+	except requests.exceptions.Timeout:
+		print(f"[-] Signer daemon timed out after {timeout}s")
+		return None
+	if r.status_code != 200:
+		print_error(SIGNER_URL, r)
+		return None
+	return r.text
+
+
+def generate_signatures(js, user_agent, url):
+	"""Sign url with the signer daemon when it is running, otherwise with a one-off node process"""
+	signatures = sign_with_daemon(user_agent, url)
+	if signatures is None:
+		signatures = subprocess_jsvmp(js, user_agent, url)
+	return signatures
 
 
 def generate_random_string(length, underline):
@@ -42,11 +79,62 @@ def assert_success(url, r):
 	return r.status_code == 200
 
 
-def convert_tags(text, session):
+# Mentions and hashtags that are not cached yet are looked up with this many requests in parallel.
+RESOLVE_WORKERS = 8
+TAG_PATTERN = r'#(\w+)|@([\w.-]+)|([^#@]+)'
+_USER_ID_PATTERN = re.compile(r'webapp\.user-detail":\{"userInfo":\{"user":\{"id":"(\d+)"')
+
+
+def resolve_cached(names, kind, fetch, max_workers=RESOLVE_WORKERS):
+	"""Resolve names through the tag cache, every cache miss is fetched in parallel with fetch(name).
+	fetch returns None when nothing was found and False when the request failed, neither is cached.
+	With max_workers=1 the misses are fetched one after the other on the calling thread."""
+	cache = TagCache.get()
+	resolved = {}
+	missing = []
+	for name in dict.fromkeys(names):
+		value = cache.lookup(kind, name)
+		if value is None:
+			missing.append(name)
+		else:
+			resolved[name] = value
+	if missing:
+		if max_workers <= 1 or len(missing) == 1:
+			fetched = {name: fetch(name) for name in missing}
+		else:
+			with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as pool:
+				fetched = dict(zip(missing, pool.map(fetch, missing)))
+		cache.store(kind, {name: value for name, value in fetched.items() if value})
+		resolved.update(fetched)
+	return resolved
+
+
+def fetch_user_id(session, username):
+	url = "https://www.tiktok.com/@" + username
+	headers = {
+		'authority': 'www.tiktok.com',
+		'accept': '*/*',
+		'accept-language': 'q=0.9,en-US;q=0.8,en;q=0.7,zh-CN;q=0.6,zh;q=0.5,vi;q=0.4',
+		'user-agent': user_agent
+	}
+
+	r = session.request("GET", url, headers=headers)
+	match = _USER_ID_PATTERN.search(r.text)
+	if not match:
+		print(f"[-] Could not find user id for @{username}")
+		return None
+	return match.group(1)
+
+
+def convert_tags(text, session, max_workers=RESOLVE_WORKERS):
 	end = 0
 	i = -1
 	text_extra = []
 
+	# Resolve every mention up front, instead of one page load per match.
+	mentions = [m.group(2) for m in re.finditer(TAG_PATTERN, text) if m.group(2)]
+	user_ids = resolve_cached(mentions, "users", lambda username: fetch_user_id(session, username), max_workers)
+
 	def text_extra_block(start, end, type, hashtag_name, user_id, tag_id):
 		return {
 			"end": end,
@@ -65,16 +153,7 @@ def convert_tags(text, session):
 			end += len(match.group(1)) + 1
 			return "<h id=\"" + str(i) + "\">#" + match.group(1) + "</h>"
 		elif match.group(2):
-			url = "https://www.tiktok.com/@" + match.group(2)
-			headers = {
-				'authority': 'www.tiktok.com',
-				'accept': '*/*',
-				'accept-language': 'q=0.9,en-US;q=0.8,en;q=0.7,zh-CN;q=0.6,zh;q=0.5,vi;q=0.4',
-				'user-agent': user_agent
-			}
-
-			r = session.request("GET", url, headers=headers)
-			user_id = r.text.split('webapp.user-detail":{"userInfo":{"user":{"id":"')[1].split('"')[0]
+			user_id = user_ids.get(match.group(2)) or ""
 			text_extra.append(text_extra_block(end, end + len(match.group(2)) + 1, 0, "", user_id, str(i)))
 			end += len(match.group(2)) + 1
 			return "<m id=\"" + str(i) + "\">@" + match.group(2) + "</m>"
@@ -82,7 +161,7 @@ def convert_tags(text, session):
 			end += len(match.group(3))
 			return match.group(3)
 
-	result = re.sub(r'#(\w+)|@([\w.-]+)|([^#@]+)', convert, text)
+	result = re.sub(TAG_PATTERN, convert, text)
 	return result, text_extra
 
 
@@ -102,33 +181,44 @@ def assertSuccess(url, r):
 	return r.status_code == 200
 
 
+def fetch_hashtag(session, tag):
+	url = "https://www.tiktok.com/api/upload/challenge/sug/"
+	params = {"keyword": tag}
+	r = session.get(url, params=params)
+	if not assertSuccess(url, r):
+		return False
+	try:
+		return r.json()["sug_list"][0]["cha_name"]
+	except:
+		return None
+
+
+def fetch_user(session, user):
+	url = "https://us.tiktok.com/api/upload/search/user/"
+	params = {"keyword": user}
+	r = session.get(url, params=params)
+	if not assertSuccess(url, r):
+		return False
+	try:
+		user_info = r.json()["user_list"][0]["user_info"]
+		return [user_info["unique_id"], user_info["uid"]]
+	except:
+		return None
+
+
 def getTagsExtra(title, tags, users, session):
 	text_extra = []
+	verified_tags = resolve_cached(tags, "hashtags", lambda tag: fetch_hashtag(session, tag))
+	verified_users = resolve_cached(users, "users_search", lambda user: fetch_user(session, user))
+	if False in verified_tags.values() or False in verified_users.values():
+		return False
 	for tag in tags:
-		url = "https://www.tiktok.com/api/upload/challenge/sug/"
-		params = {"keyword": tag}
-		r = session.get(url, params=params)
-		if not assertSuccess(url, r):
-			return False
-		try:
-			verified_tag = r.json()["sug_list"][0]["cha_name"]
-		except:
-			verified_tag = tag
+		verified_tag = verified_tags[tag] or tag
 		title += " #"+verified_tag
 		text_extra.append({"start": len(title)-len(verified_tag)-1, "end": len(
 			title), "user_id": "", "type": 1, "hashtag_name": verified_tag})
 	for user in users:
-		url = "https://us.tiktok.com/api/upload/search/user/"
-		params = {"keyword": user}
-		r = session.get(url, params=params)
-		if not assertSuccess(url, r):
-			return False
-		try:
-			verified_user = r.json()["user_list"][0]["user_info"]["unique_id"]
-			verified_user_id = r.json()["user_list"][0]["user_info"]["uid"]
-		except:
-			verified_user = user
-			verified_user_id = ""
+		verified_user, verified_user_id = verified_users[user] or (user, "")
 		title += " @"+verified_user
 		text_extra.append({"start": len(title)-len(verified_user)-1, "end": len(
 			title), "user_id": verified_user_id, "type": 0, "hashtag_name": verified_user})
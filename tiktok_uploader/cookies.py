@@ -61,6 +61,18 @@ def delete_all_cookies_files(cookies_path=None):
     print("Deleted all cookies files.")
 
 
-def update_dc_location(filename:str, new_dc_location: str):
+def update_dc_location(filename: str, new_dc_location: str, cookies_path=None):
     """As datacenter location can change per load, we need to update based on response set cookies headers, in the case of dc change, we need to update settings"""
-    raise NotImplementedError("This function is not implemented yet.")
\ No newline at end of file
+    cookies = load_cookies_from_file(filename, cookies_path)
+    if not cookies:
+        return False
+    dc_cookie = next((c for c in cookies if c["name"] == "tt-target-idc"), None)
+    if dc_cookie is None:
+        session_cookie = next((c for c in cookies if c["name"] == "sessionid"), {})
+        dc_cookie = {"name": "tt-target-idc", "domain": session_cookie.get("domain", ".tiktok.com"), "path": "/"}
+        cookies.append(dc_cookie)
+    elif dc_cookie["value"] == new_dc_location:
+        return False
+    dc_cookie["value"] = new_dc_location
+    save_cookies_to_file(cookies, filename, cookies_path)
+    return True
@@ -0,0 +1,101 @@
+import os, json, time, hashlib, threading
+from tiktok_uploader.Config import Config
+
+
+# The upload host's part auth handed out with the upload node is short lived, when TikTok does
+# not tell us when it expires the journal is only trusted for this long.
+DEFAULT_CREDENTIALS_TTL = 3000
+
+# Phases in the order upload_video goes through them. "posting" is set before project/post is
+# sent and only left when TikTok answered, a journal still at it may already be published.
+PHASES = ["applied", "transferred", "finished", "committed", "posting"]
+
+
+class UploadJournal:
+	"""Small on-disk record of an upload in progress, so a restarted process can resume it.
+
+	A journal is keyed by the account and the video file (path, size and mtime), and holds
+	everything needed to skip the phases that already completed: the project, the upload node
+	and the CRC of every part already accepted by the upload host. The AWS credentials of
+	video/upload/auth are not kept, and the file is only readable by its owner."""
+
+	def __init__(self, path, key):
+		self.path = path
+		self.key = key
+		self.data = {"key": key, "phase": None, "parts": {}, "created_at": int(time.time())}
+		# Steps of the same upload run on different threads and all write here.
+		self._lock = threading.RLock()
+
+	@staticmethod
+	def open(session_user, video_path, journal_dir=None):
+		"""Load the journal for this account and video, or start a fresh one if none is usable"""
+		if not journal_dir:
+			journal_dir = os.path.join(os.getcwd(), Config.get().journal_dir)
+		os.makedirs(journal_dir, exist_ok=True)
+		stat = os.stat(video_path)
+		key = f"{session_user}|{os.path.abspath(video_path)}|{stat.st_size}|{int(stat.st_mtime)}"
+		name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+		journal = UploadJournal(os.path.join(journal_dir, name), key)
+		if os.path.exists(journal.path):
+			try:
+				with open(journal.path, "r") as f:
+					data = json.load(f)
+			except (OSError, ValueError):
+				data = None
+			if data and data.get("key") == key and data.get("expires_at", 0) > time.time():
+				# Journals written by older versions held the credentials.
+				data.pop("credentials", None)
+				journal.data = data
+				print(f"[+] Resuming upload from journal (phase: {data.get('phase')}, {len(data.get('parts', {}))} parts done)")
+			else:
+				journal.discard()
+		return journal
+
+	def get(self, name, default=None):
+		return self.data.get(name, default)
+
+	def reached(self, phase):
+		"""Whether the upload already completed the given phase"""
+		current = self.data.get("phase")
+		# Phases of older journals ("created") are not in PHASES, those uploads start over from apply.
+		return current in PHASES and PHASES.index(current) >= PHASES.index(phase)
+
+	def update(self, phase=None, **values):
+		with self._lock:
+			self.data.update(values)
+			# Phases only move forward, whichever step finishes first.
+			if phase and not self.reached(phase):
+				self.data["phase"] = phase
+			self.save()
+
+	def rewind(self, phase):
+		"""Go back to phase, for a step that turned out not to have taken place"""
+		with self._lock:
+			self.data["phase"] = phase
+			self.save()
+
+	def set_credentials_expiry(self, expires_at=None):
+		self.data["expires_at"] = int(expires_at or time.time() + DEFAULT_CREDENTIALS_TTL)
+
+	@property
+	def parts(self):
+		"""Finished parts as {part_number: crc}"""
+		return {int(n): crc for n, crc in self.data.get("parts", {}).items()}
+
+	def mark_part(self, part_number, crc):
+		with self._lock:
+			self.data.setdefault("parts", {})[str(part_number)] = crc
+			self.save()
+
+	def save(self):
+		# Write to a temporary file first so a crash never leaves a half written journal.
+		with self._lock:
+			tmp_path = self.path + ".tmp"
+			with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+				json.dump(self.data, f)
+			os.replace(tmp_path, self.path)
+
+	def discard(self):
+		with self._lock:
+			if os.path.exists(self.path):
+				os.remove(self.path)
@@ -0,0 +1,125 @@
+import os, json, time, datetime, threading
+from contextlib import contextmanager
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import file_lock, read_json, write_json
+
+
+# TikTok accepts a schedule_time between 15 minutes and 10 days ahead.
+MIN_SCHEDULE = 900
+MAX_SCHEDULE = 864000
+# Slots closer than this are not planned, so the upload still has time to finish before the
+# post request and the video stays inside the window.
+UPLOAD_MARGIN = 1800
+# Local times an account posts at, unless its channel in channels_config.json has "post_slots".
+DEFAULT_POST_SLOTS = ["07:00", "12:00", "17:00", "20:00"]
+CHANNELS_CONFIG = "channels_config.json"
+
+
+class PostPlanner:
+	"""Spreads a backlog of videos over each account's posting slots inside TikTok's scheduling window.
+
+	Videos are uploaded right away with a schedule_time, so TikTok publishes them at their slot
+	and uploads are not held back by the posting pace. Slots given out are kept in
+	CACHE_DIR/planned_posts.json, so runs planned one after the other never share a slot.
+	Slots are claimed and released under a file lock on the file as it is on disk, so the
+	worker, the monitor and CLI runs planning at the same time do not either."""
+
+	def __init__(self, path=None, config_path=None):
+		self.path = path or os.path.join(os.getcwd(), Config.get().cache_dir, "planned_posts.json")
+		self._lock = threading.Lock()
+		self.claimed = read_json(self.path, {})
+		self.post_slots = {}
+		try:
+			with open(config_path or os.path.join(os.getcwd(), CHANNELS_CONFIG), "r") as f:
+				channels = json.load(f).get("channels", [])
+		except (OSError, ValueError):
+			channels = []
+		for channel in channels:
+			if channel.get("tiktok_user") and channel.get("post_slots"):
+				self.post_slots[channel["tiktok_user"]] = channel["post_slots"]
+
+	def _save(self):
+		now = time.time()
+		self.claimed = {account: [t for t in slots if t > now] for account, slots in self.claimed.items()}
+		write_json(self.path, self.claimed)
+
+	@contextmanager
+	def _transaction(self):
+		# Other processes claim slots in the same file, the change applies to what is on disk now.
+		with self._lock, file_lock(self.path):
+			self.claimed = read_json(self.path, {})
+			yield
+			self._save()
+
+	def slots(self, account):
+		return sorted(self.post_slots.get(account, DEFAULT_POST_SLOTS))
+
+	def _slot_times(self, account, start, end):
+		# Every slot of the account between start and end, as timestamps in order.
+		day = datetime.date.fromtimestamp(start)
+		while True:
+			for slot in self.slots(account):
+				hour, minute = (int(part) for part in slot.split(":"))
+				at = datetime.datetime.combine(day, datetime.time(hour, minute)).timestamp()
+				if at > end:
+					return
+				if at >= start:
+					yield int(at)
+			day += datetime.timedelta(days=1)
+
+	def next_slot(self, account):
+		"""Claim the earliest free slot of account that can still be scheduled, None if the window is full"""
+		now = time.time()
+		with self._transaction():
+			taken = set(self.claimed.get(account, []))
+			for at in self._slot_times(account, now + MIN_SCHEDULE + UPLOAD_MARGIN, now + MAX_SCHEDULE - 60):
+				if at not in taken:
+					self.claimed.setdefault(account, []).append(at)
+					return at
+		return None
+
+	def release(self, account, publish_at):
+		"""Give back the slot of an upload that failed"""
+		with self._transaction():
+			if publish_at in self.claimed.get(account, []):
+				self.claimed[account].remove(publish_at)
+
+	def plan(self, backlog):
+		"""Give each {"users", "video", "title", ...} of backlog a publish_at slot.
+		Returns (planned jobs, items left for a later run because the window is full)."""
+		planned, left = [], []
+		for item in backlog:
+			publish_at = self.next_slot(item["users"])
+			if publish_at is None:
+				left.append(item)
+			else:
+				planned.append(dict(item, publish_at=publish_at))
+		return planned, left
+
+
+def schedule_time_for(publish_at, now=None):
+	"""schedule_time to send at now (default: the current time) for a post planned at publish_at,
+	kept inside TikTok's window"""
+	now = time.time() if now is None else now
+	return int(min(MAX_SCHEDULE, max(MIN_SCHEDULE, publish_at - now)))
+
+
+def run_backlog(backlog, planner=None, **limits):
+	"""Plan the backlog and upload every planned video concurrently, each scheduled at its slot.
+	Returns one report per backlog item, items that did not fit are reported as "unplanned"."""
+	from tiktok_uploader.async_upload import upload_many
+
+	planner = planner or PostPlanner()
+	planned, left = planner.plan(backlog)
+	for job in planned:
+		print(f"[+] {job['users']}: {job['video']} planned for {datetime.datetime.fromtimestamp(job['publish_at']):%Y-%m-%d %H:%M}")
+	reports = upload_many(planned, **limits) if planned else []
+	for job, report in zip(planned, reports):
+		report["publish_at"] = job["publish_at"]
+		# A post that got no answer may hold its slot on TikTok already.
+		if report["status"] not in ("published", "unknown"):
+			planner.release(job["users"], job["publish_at"])
+	for item in left:
+		print(f"[-] {item['users']}: no free slot left for {item['video']} in the next 10 days")
+		reports.append({"users": item["users"], "video": item["video"], "status": "unplanned"})
+	return reports
@@ -0,0 +1,305 @@
+import os, json, struct, shutil, threading, subprocess
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import write_json
+
+
+# Box types holding other boxes, only these are walked in an MP4/MOV file.
+MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+# Matroska/WebM element ids: EBML header, Segment, Info, TimestampScale, Duration, Tracks,
+# TrackEntry, TrackType, CodecID, Video, PixelWidth, PixelHeight, Cluster.
+EBML = 0x1A45DFA3
+SEGMENT = 0x18538067
+INFO = 0x1549A966
+TIMESTAMP_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+FFPROBE_TIMEOUT = 30
+
+
+def _empty(container):
+	return {"container": container, "duration": None, "width": None, "height": None, "vcodec": None, "acodec": None}
+
+
+def _boxes(f, start, end):
+	# (type, payload offset, payload end) of each box between start and end.
+	while start + 8 <= end:
+		f.seek(start)
+		header = f.read(8)
+		if len(header) < 8:
+			return
+		size, kind = struct.unpack(">I4s", header)
+		offset = start + 8
+		if size == 1:
+			size = struct.unpack(">Q", f.read(8))[0]
+			offset += 8
+		elif size == 0:
+			size = end - start
+		if size < offset - start:
+			return
+		yield kind, offset, min(start + size, end)
+		start += size
+
+
+def probe_mp4(f, file_size):
+	"""Duration, dimensions and codecs from the moov box, without reading the media data"""
+	info = _empty("mp4")
+	moov = next(((offset, end) for kind, offset, end in _boxes(f, 0, file_size) if kind == b"moov"), None)
+	if moov is None:
+		return None
+
+	def walk(start, end, track):
+		for kind, offset, box_end in _boxes(f, start, end):
+			f.seek(offset)
+			if kind == b"mvhd":
+				payload = f.read(32)
+				if payload[0] == 1:
+					timescale, duration = struct.unpack(">IQ", payload[20:32])
+				else:
+					timescale, duration = struct.unpack(">II", payload[12:20])
+				if timescale and duration:
+					info["duration"] = duration / timescale
+			elif kind == b"trak":
+				track = {}
+				walk(offset, box_end, track)
+				if track.get("handler") == b"vide":
+					info["vcodec"] = info["vcodec"] or track.get("codec")
+					info["width"] = info["width"] or track.get("width")
+					info["height"] = info["height"] or track.get("height")
+				elif track.get("handler") == b"soun":
+					info["acodec"] = info["acodec"] or track.get("codec")
+			elif kind == b"tkhd":
+				# Width and height are the last 8 bytes, 16.16 fixed point.
+				f.seek(box_end - 8)
+				width, height = struct.unpack(">II", f.read(8))
+				track["width"], track["height"] = width >> 16, height >> 16
+			elif kind == b"hdlr":
+				track["handler"] = f.read(12)[8:12]
+			elif kind == b"stsd":
+				track["codec"] = f.read(16)[12:16].decode("latin-1").strip()
+			elif kind in MP4_CONTAINERS:
+				walk(offset, box_end, track)
+
+	walk(moov[0], moov[1], {})
+	# Fragmented files leave the movie duration at 0, ffprobe reads those.
+	return info if info["duration"] else None
+
+
+def _vint(f, keep_marker):
+	first = f.read(1)
+	if not first:
+		return None, 0
+	first = first[0]
+	length = 1
+	while length <= 8 and not first & (0x80 >> (length - 1)):
+		length += 1
+	if length > 8:
+		return None, 0
+	value = first if keep_marker else first & (0xFF >> length)
+	for byte in f.read(length - 1):
+		value = (value << 8) | byte
+	unknown = not keep_marker and value == (1 << (7 * length)) - 1
+	return (None if unknown else value), length
+
+
+def _elements(f, start, end):
+	# (id, payload offset, payload end) of each EBML element between start and end.
+	while start < end:
+		f.seek(start)
+		element_id, id_length = _vint(f, True)
+		size, size_length = _vint(f, False)
+		if element_id is None or id_length == 0 or size_length == 0:
+			return
+		offset = start + id_length + size_length
+		payload_end = end if size is None else min(offset + size, end)
+		yield element_id, offset, payload_end
+		if size is None:
+			return
+		start = payload_end
+
+
+def _uint(f, offset, end):
+	f.seek(offset)
+	return int.from_bytes(f.read(end - offset), "big")
+
+
+def probe_matroska(f, file_size):
+	"""Duration, dimensions and codecs from the Info and Tracks elements of a WebM/MKV file"""
+	info = _empty("matroska")
+	segment = next(((offset, end) for element_id, offset, end in _elements(f, 0, file_size) if element_id == SEGMENT), None)
+	if segment is None:
+		return None
+	scale, duration = 1000000, None
+	for element_id, offset, end in _elements(f, *segment):
+		if element_id == INFO:
+			for child, child_offset, child_end in _elements(f, offset, end):
+				if child == TIMESTAMP_SCALE:
+					scale = _uint(f, child_offset, child_end)
+				elif child == DURATION:
+					f.seek(child_offset)
+					raw = f.read(child_end - child_offset)
+					duration = struct.unpack(">f" if len(raw) == 4 else ">d", raw)[0]
+		elif element_id == TRACKS:
+			for entry, entry_offset, entry_end in _elements(f, offset, end):
+				if entry != TRACK_ENTRY:
+					continue
+				track = {}
+				for child, child_offset, child_end in _elements(f, entry_offset, entry_end):
+					if child == TRACK_TYPE:
+						track["type"] = _uint(f, child_offset, child_end)
+					elif child == CODEC_ID:
+						f.seek(child_offset)
+						track["codec"] = f.read(child_end - child_offset).decode("latin-1").strip("\x00")
+					elif child == VIDEO:
+						for dim, dim_offset, dim_end in _elements(f, child_offset, child_end):
+							if dim == PIXEL_WIDTH:
+								track["width"] = _uint(f, dim_offset, dim_end)
+							elif dim == PIXEL_HEIGHT:
+								track["height"] = _uint(f, dim_offset, dim_end)
+				if track.get("type") == 1 and not info["vcodec"]:
+					info.update(vcodec=track.get("codec"), width=track.get("width"), height=track.get("height"))
+				elif track.get("type") == 2 and not info["acodec"]:
+					info["acodec"] = track.get("codec")
+		elif element_id == CLUSTER:
+			# Media data starts here, Info and Tracks come before it.
+			break
+	if duration:
+		info["duration"] = duration * scale / 1e9
+	return info if info["duration"] else None
+
+
+def probe_ffprobe(path):
+	"""Fallback for anything the header parsers do not read, None when ffprobe is not installed"""
+	if not shutil.which("ffprobe"):
+		return None
+	try:
+		out = subprocess.run(
+			["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+			capture_output=True, text=True, timeout=FFPROBE_TIMEOUT, check=True
+		).stdout
+		data = json.loads(out)
+	except (subprocess.SubprocessError, ValueError, OSError):
+		return None
+	info = _empty(data.get("format", {}).get("format_name"))
+	for stream in data.get("streams", []):
+		if stream.get("codec_type") == "video" and not info["vcodec"]:
+			info.update(vcodec=stream.get("codec_name"), width=stream.get("width"), height=stream.get("height"))
+		elif stream.get("codec_type") == "audio" and not info["acodec"]:
+			info["acodec"] = stream.get("codec_name")
+	try:
+		info["duration"] = float(data["format"]["duration"])
+	except (KeyError, TypeError, ValueError):
+		return None
+	return info
+
+
+def probe_file(path):
+	"""Probe a video file without an index, None if it cannot be read"""
+	try:
+		size = os.path.getsize(path)
+		with open(path, "rb") as f:
+			head = f.read(12)
+			if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+				info = probe_mp4(f, size)
+			elif head[:4] == EBML.to_bytes(4, "big"):
+				info = probe_matroska(f, size)
+			else:
+				info = None
+	except (OSError, struct.error, IndexError, ValueError):
+		info = None
+	return info or probe_ffprobe(path)
+
+
+class ProbeIndex:
+	"""Probe results kept in CACHE_DIR/video_probe.json, keyed by path and checked against the
+	file's size and mtime, so a file is only probed again once it changed"""
+
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, path):
+		self.path = path
+		self._lock = threading.Lock()
+		self.entries = {}
+		if os.path.exists(path):
+			try:
+				with open(path, "r") as f:
+					self.entries = json.load(f)
+			except (OSError, ValueError):
+				pass
+		# Files that are gone (temporary downloads, uploaded videos) are forgotten.
+		self.entries = {k: v for k, v in self.entries.items() if os.path.exists(k)}
+
+	@staticmethod
+	def get():
+		path = os.path.join(os.getcwd(), Config.get().cache_dir, "video_probe.json")
+		with ProbeIndex._instances_lock:
+			if path not in ProbeIndex._instances:
+				ProbeIndex._instances[path] = ProbeIndex(path)
+			return ProbeIndex._instances[path]
+
+	def _save(self):
+		write_json(self.path, self.entries)
+
+	def _probe(self, path):
+		# Returns (info, whether the index changed).
+		path = os.path.abspath(path)
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None, False
+		with self._lock:
+			entry = self.entries.get(path)
+		if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+			return entry["info"], False
+		info = probe_file(path)
+		if info is None:
+			return None, False
+		with self._lock:
+			self.entries[path] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "info": info}
+		return info, True
+
+	def probe(self, path):
+		"""{container, duration, width, height, vcodec, acodec} of a video file, None if it cannot be read"""
+		info, changed = self._probe(path)
+		if changed:
+			with self._lock:
+				self._save()
+		return info
+
+	def probe_many(self, paths):
+		"""Probe every path and write the index once, returns {path: info or None}"""
+		results, changed = {}, False
+		for path in paths:
+			results[path], probed = self._probe(path)
+			changed = changed or probed
+		if changed:
+			with self._lock:
+				self._save()
+		return results
+
+	def forget(self, path):
+		"""Drop the entry of a file that was removed"""
+		with self._lock:
+			if self.entries.pop(os.path.abspath(path), None) is not None:
+				self._save()
+
+
+def probe(path):
+	return ProbeIndex.get().probe(path)
+
+
+def forget(path):
+	ProbeIndex.get().forget(path)
+
+
+def video_duration(path):
+	"""Duration of a video file in seconds, None if it cannot be read"""
+	info = probe(path)
+	return info["duration"] if info else None
@@ -0,0 +1,105 @@
+import os, json, time, threading
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import write_json
+from tiktok_uploader.cookies import load_cookies_from_file, update_dc_location
+
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/68.0.3440.106 Safari/537.36'
+# msToken is refreshed with a warm-up request once it is older than this, even if its cookie lives longer.
+MS_TOKEN_MAX_AGE = 6 * 3600
+
+_dc_lock = threading.Lock()
+
+
+class AccountProfile:
+	"""Per-account state persisted next to the session cookie, so uploads keep the same
+	fingerprint and skip work that was already done by a previous run:
+	- a stable user agent, picked once instead of on every upload
+	- sessionid and tt-target-idc, only re-read from the pickle when the cookie file changes
+	- the last msToken and when it expires, so the warm-up request is only sent when it is stale"""
+
+	def __init__(self, account, path, data):
+		self.account = account
+		self.path = path
+		self.data = data
+
+	@staticmethod
+	def load(account, cookies_path=None):
+		cookie_dir = cookies_path or os.path.join(os.getcwd(), Config.get().cookies_dir)
+		path = os.path.join(cookie_dir, f"tiktok_profile-{account}.json")
+		data = {}
+		if os.path.exists(path):
+			try:
+				with open(path, "r") as f:
+					data = json.load(f)
+			except (OSError, ValueError):
+				data = {}
+		return AccountProfile(account, path, data)
+
+	def save(self):
+		self.data["updated_at"] = int(time.time())
+		write_json(self.path, self.data, indent=2)
+
+	@property
+	def user_agent(self):
+		if not self.data.get("user_agent"):
+			from fake_useragent import FakeUserAgentError, UserAgent
+			try:
+				self.data["user_agent"] = UserAgent().random
+			except FakeUserAgentError:
+				print("[-] Could not get random user agent, using default")
+				self.data["user_agent"] = DEFAULT_USER_AGENT
+			self.save()
+		return self.data["user_agent"]
+
+	def session_cookies(self):
+		"""(sessionid, tt-target-idc) for the account, the cookie pickle is only read when it changed"""
+		cookie_path = os.path.join(os.path.dirname(self.path), f"tiktok_session-{self.account}.cookie")
+		mtime = os.path.getmtime(cookie_path) if os.path.exists(cookie_path) else None
+		if mtime is None or mtime != self.data.get("cookie_mtime") or not self.data.get("session_id"):
+			cookies = load_cookies_from_file(f"tiktok_session-{self.account}", os.path.dirname(self.path))
+			self.data["session_id"] = next((c["value"] for c in cookies if c["name"] == 'sessionid'), None)
+			self.data["dc_id"] = next((c["value"] for c in cookies if c["name"] == 'tt-target-idc'), None)
+			self.data["cookie_mtime"] = mtime
+			# A new login invalidates whatever was cached for the old session.
+			self.data.pop("ms_token", None)
+			if self.data["session_id"]:
+				self.save()
+		return self.data.get("session_id"), self.data.get("dc_id")
+
+	def update_dc(self, dc_id):
+		"""Save a datacenter assigned by TikTok (tt-target-idc Set-Cookie) in the profile and the cookie file"""
+		if not dc_id or dc_id == self.data.get("dc_id"):
+			return False
+		with _dc_lock:
+			if dc_id == self.data.get("dc_id"):
+				return False
+			cookie_dir = os.path.dirname(self.path)
+			update_dc_location(f"tiktok_session-{self.account}", dc_id, cookie_dir)
+			cookie_path = os.path.join(cookie_dir, f"tiktok_session-{self.account}.cookie")
+			self.data["dc_id"] = dc_id
+			# The cookie file changed because of us, not a new login.
+			if os.path.exists(cookie_path):
+				self.data["cookie_mtime"] = os.path.getmtime(cookie_path)
+			self.save()
+		print(f"[+] Tiktok Datacenter changed to {dc_id}")
+		return True
+
+	@property
+	def ms_token(self):
+		"""The cached msToken, or None once it has expired"""
+		if self.data.get("ms_token") and self.data.get("ms_token_expires", 0) > time.time():
+			return self.data["ms_token"]
+		return None
+
+	def remember_ms_token(self, cookies):
+		"""Store the msToken found in a cookie jar along with its expiry"""
+		cookie = next((c for c in cookies if c.name == "msToken"), None)
+		if cookie is None or cookie.value == self.data.get("ms_token"):
+			return
+		expires = time.time() + MS_TOKEN_MAX_AGE
+		if cookie.expires:
+			expires = min(expires, cookie.expires)
+		self.data["ms_token"] = cookie.value
+		self.data["ms_token_expires"] = int(expires)
+		self.save()
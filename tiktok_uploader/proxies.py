@@ -0,0 +1,228 @@
+import os, json, time, threading
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from tiktok_uploader.Config import Config
+from tiktok_uploader.sessions import get_session
+from tiktok_uploader.storage import write_json
+
+
+CHANNELS_CONFIG = "channels_config.json"
+# Proxies are checked by reaching TikTok through them, not only by looking up where they are.
+PROBE_URL = "https://www.tiktok.com"
+PROBE_TIMEOUT = 8
+PROBE_INTERVAL = 60
+# Health stats older than this are checked again before a proxy is used, they are kept in
+# CACHE_DIR/proxy_health.json so one-off uploads can rely on what earlier runs saw.
+HEALTH_TTL = 600
+# A proxy leaves the rotation after this many failures in a row, until a probe gets through again.
+MAX_FAILURES = 2
+# Size used to compare proxies by expected upload time when their throughput is known.
+REFERENCE_SIZE = 20 * 1048576
+# Probe sessions are kept apart from the accounts' sessions, one per proxy.
+PROBE_ACCOUNT = "__proxy_probe__"
+
+
+def proxy_url(proxy):
+	"""requests proxy URL for a channels_config.json proxy entry, None if it is disabled"""
+	if not proxy or not proxy.get("enabled", True) or not proxy.get("host"):
+		return None
+	auth = ""
+	if proxy.get("username"):
+		auth = f"{quote(str(proxy['username']), safe='')}:{quote(str(proxy.get('password', '')), safe='')}@"
+	port = f":{proxy['port']}" if proxy.get("port") else ""
+	return f"http://{auth}{proxy['host']}{port}"
+
+
+def describe(url):
+	# host:port only, credentials stay out of the logs.
+	return url.split("@")[-1].split("://")[-1]
+
+
+class ProxyPool:
+	"""Proxies of every account from channels_config.json, with rolling health stats.
+
+	A background thread probes each proxy through TikTok and keeps its success rate, latency
+	and (from real uploads) throughput. candidates() returns the healthy proxies of an account,
+	best first, and upload_with_failover moves an upload to the next one when a proxy dies."""
+
+	_instance = None
+	_instance_lock = threading.Lock()
+
+	def __init__(self, accounts, path=None):
+		self.accounts = accounts
+		self.path = path
+		self.stats = {}
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread = None
+		if path and os.path.exists(path):
+			try:
+				with open(path, "r") as f:
+					saved = json.load(f)
+			except (OSError, ValueError):
+				saved = {}
+			# Saved by host:port, the proxy credentials are not written to the cache.
+			for url in {url for urls in accounts.values() for url in urls}:
+				if describe(url) in saved:
+					self.stats[url] = saved[describe(url)]
+
+	@staticmethod
+	def load(config_path=None):
+		config_path = config_path or os.path.join(os.getcwd(), CHANNELS_CONFIG)
+		try:
+			with open(config_path, "r") as f:
+				config = json.load(f)
+		except (OSError, ValueError):
+			config = {}
+		accounts = {}
+		for channel in config.get("channels", []):
+			url = proxy_url(channel.get("proxy")) if channel.get("enabled", True) else None
+			if url and channel.get("tiktok_user"):
+				urls = accounts.setdefault(channel["tiktok_user"], [])
+				if url not in urls:
+					urls.append(url)
+		return ProxyPool(accounts, os.path.join(os.getcwd(), Config.get().cache_dir, "proxy_health.json"))
+
+	@staticmethod
+	def get():
+		with ProxyPool._instance_lock:
+			if ProxyPool._instance is None:
+				ProxyPool._instance = ProxyPool.load()
+			return ProxyPool._instance
+
+	def has_proxies(self, account):
+		return bool(self.accounts.get(account))
+
+	def _stats(self, url):
+		return self.stats.setdefault(url, {"healthy": True, "failures": 0, "success_rate": 1.0, "latency": None, "throughput": None, "checked_at": 0})
+
+	def _save(self):
+		if not self.path:
+			return
+		write_json(self.path, {describe(url): stats for url, stats in self.stats.items()})
+
+	def stale(self, url):
+		"""Whether url was not checked within HEALTH_TTL"""
+		with self._lock:
+			return time.time() - self._stats(url)["checked_at"] > HEALTH_TTL
+
+	def record(self, url, ok, latency=None, throughput=None):
+		"""Blend the outcome of a probe or a real request into the stats of url"""
+		with self._lock:
+			stats = self._stats(url)
+			stats["success_rate"] = 0.8 * stats["success_rate"] + 0.2 * (1 if ok else 0)
+			stats["checked_at"] = int(time.time())
+			if not ok:
+				stats["failures"] += 1
+				stats["healthy"] = stats["failures"] < MAX_FAILURES
+			else:
+				stats["failures"] = 0
+				stats["healthy"] = True
+				for name, value in (("latency", latency), ("throughput", throughput)):
+					if value:
+						stats[name] = value if stats[name] is None else 0.7 * stats[name] + 0.3 * value
+			self._save()
+
+	def probe(self, url):
+		"""Reach TikTok through url, returns whether it answered"""
+		session = get_session(PROBE_ACCOUNT, url)
+		start = time.time()
+		try:
+			session.head(PROBE_URL, timeout=PROBE_TIMEOUT)
+		except Exception as e:
+			print(f"[-] Proxy {describe(url)} failed health check: {e.__class__.__name__}")
+			self.record(url, False)
+			return False
+		self.record(url, True, latency=time.time() - start)
+		return True
+
+	def probe_all(self, account=None):
+		urls = self.accounts.get(account, []) if account else {url for urls in self.accounts.values() for url in urls}
+		urls = list(urls)
+		if not urls:
+			return
+		with ThreadPoolExecutor(max_workers=min(8, len(urls))) as pool:
+			list(pool.map(self.probe, urls))
+
+	def _score(self, url):
+		# Expected seconds for a reference upload, made worse by a poor success rate.
+		stats = self._stats(url)
+		seconds = stats["latency"] or PROBE_TIMEOUT
+		if stats["throughput"]:
+			seconds += REFERENCE_SIZE / stats["throughput"]
+		return seconds / max(stats["success_rate"], 0.05)
+
+	def candidates(self, account):
+		"""Healthy proxies of account, best first. Proxies that failed are back once their stats are
+		older than HEALTH_TTL, so they are probed again before the next upload through them."""
+		now = time.time()
+		with self._lock:
+			urls = [url for url in self.accounts.get(account, []) if self._stats(url)["healthy"] or now - self._stats(url)["checked_at"] > HEALTH_TTL]
+			return sorted(urls, key=self._score)
+
+	def best(self, account):
+		candidates = self.candidates(account)
+		return candidates[0] if candidates else None
+
+	def start(self, interval=PROBE_INTERVAL):
+		"""Probe every proxy now and then every interval seconds on a daemon thread"""
+		if self._thread is not None and self._thread.is_alive():
+			return
+		self._stop.clear()
+
+		def loop():
+			while True:
+				self.probe_all()
+				if self._stop.wait(interval):
+					break
+
+		self._thread = threading.Thread(target=loop, name="proxy-probe", daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._stop.set()
+
+
+def upload_with_failover(session_user, video, title, pool=None, report=None, **options):
+	"""upload_video through the best healthy proxy of the account, moving to the next proxy when
+	the current one stops answering. The upload journal lets each attempt resume where the last
+	one stopped, so a proxy dying mid-transfer only costs the parts in flight. A post that got no
+	answer is never retried, report["status"] is then "unknown"."""
+	import requests
+	from tiktok_uploader import tiktok
+
+	pool = pool or ProxyPool.get()
+	report = {} if report is None else report
+	tried = []
+	while True:
+		proxy = next((url for url in pool.candidates(session_user) if url not in tried), None)
+		if proxy is None:
+			print(f"[-] No healthy proxy left for {session_user}")
+			report["error"] = "no healthy proxy"
+			return False
+		tried.append(proxy)
+		# Proxies are only probed here when nothing recent is known about them, a proxy that
+		# fails during the upload is probed below.
+		if pool.stale(proxy) and not pool.probe(proxy):
+			continue
+		report["proxy"] = describe(proxy)
+		try:
+			ok = tiktok.upload_video(session_user, video, title, proxy=proxy, report=report, **options)
+		except requests.exceptions.RequestException as e:
+			# The post step handles its own errors, only a request that never reached TikTok
+			# gets here from it (see publish_video), so every step is safe to run again.
+			print(f"[-] Upload through {describe(proxy)} failed: {e.__class__.__name__}")
+			pool.record(proxy, False)
+			ok = None
+
+		if ok:
+			# Measured on the parts sent through this proxy, a resumed transfer sends only some.
+			pool.record(proxy, True, throughput=report.get("throughput"))
+			return True
+		if report.get("status") == "unknown":
+			# The post may have been published, PostVerifier settles it instead of a second post.
+			return False
+		# Only a proxy that stopped answering is worth another attempt, any other failure is final.
+		if ok is False and pool.probe(proxy):
+			return False
+		print(f"[-] Proxy {describe(proxy)} is down, retrying with the next one")
@@ -0,0 +1,85 @@
+import os, shutil, subprocess
+from tiktok_uploader.probe import probe
+
+
+def _env_int(name, default):
+	# A malformed value falls back to the default instead of breaking the import.
+	try:
+		return int(os.getenv(name, default))
+	except ValueError:
+		print(f"[-] Ignoring {name}={os.getenv(name)!r}, using {default}")
+		return default
+
+
+# x264 settings of the retime encode, RETIME_THREADS=0 lets ffmpeg pick.
+PRESET = os.getenv("RETIME_PRESET") or "medium"
+CRF = _env_int("RETIME_CRF", 23)
+THREADS = _env_int("RETIME_THREADS", 0)
+# A hung ffmpeg is killed after this many seconds, it would hold the encode slot forever.
+TIMEOUT = _env_int("RETIME_TIMEOUT", 600)
+FPS = 30
+
+
+def ffmpeg_binary():
+	"""ffmpeg on the PATH, else the one imageio-ffmpeg ships for moviepy, None if there is neither"""
+	binary = shutil.which("ffmpeg")
+	if binary:
+		return binary
+	try:
+		import imageio_ffmpeg
+		return imageio_ffmpeg.get_ffmpeg_exe()
+	except Exception:
+		return None
+
+
+def atempo_chain(speed):
+	# atempo only takes factors between 0.5 and 2 on older ffmpeg builds, larger changes are chained.
+	factors = []
+	while speed < 0.5:
+		factors.append(0.5)
+		speed /= 0.5
+	while speed > 2.0:
+		factors.append(2.0)
+		speed /= 2.0
+	factors.append(speed)
+	return ",".join(f"atempo={factor:.6f}" for factor in factors)
+
+
+def retime(input_path, output_path, target_duration, preset=PRESET, crf=CRF, threads=THREADS, timeout=TIMEOUT):
+	"""Stretch or speed up a video to target_duration seconds with one ffmpeg run (setpts/atempo).
+	Returns False when ffmpeg is missing or fails, so the caller can fall back to moviepy."""
+	binary = ffmpeg_binary()
+	info = probe(input_path)
+	if binary is None or info is None or not info["duration"]:
+		return False
+	speed = info["duration"] / target_duration
+
+	# Written next to the output under a name of its own, concurrent jobs never share a file.
+	tmp_path = f"{output_path}.part.mp4"
+	cmd = [
+		binary, "-y", "-v", "error", "-i", input_path,
+		"-map", "0:v:0", "-filter:v", f"setpts=PTS/{speed:.6f}", "-r", str(FPS),
+		"-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+		"-threads", str(threads),
+	]
+	if info["acodec"]:
+		cmd += ["-map", "0:a:0", "-filter:a", atempo_chain(speed), "-c:a", "aac"]
+	cmd += ["-t", f"{target_duration:.3f}", "-movflags", "+faststart", tmp_path]
+
+	try:
+		result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+	except subprocess.TimeoutExpired:
+		print(f"[-] ffmpeg retime timed out after {timeout}s")
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		return False
+	except OSError as e:
+		print(f"[-] ffmpeg could not be started: {e}")
+		return False
+	if result.returncode != 0:
+		print(f"[-] ffmpeg retime failed: {result.stderr.strip()[-500:]}")
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		return False
+	os.replace(tmp_path, output_path)
+	return True
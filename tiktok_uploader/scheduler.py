@@ -0,0 +1,183 @@
+import os, time, threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import file_lock, read_json, write_json
+
+
+# Starting rate of an account nothing was learned about yet, and the bounds it is learned within.
+DEFAULT_POSTS_PER_HOUR = 6
+MIN_POSTS_PER_HOUR = 1
+MAX_POSTS_PER_HOUR = 30
+# Posts an account may make back to back before the hourly rate applies.
+BURST = 2
+# Added to the rate after each accepted post.
+RATE_STEP = 0.5
+# Pause after a rate-limit answer, doubled for each one in a row.
+THROTTLE_BACKOFF = 600
+# status_msg fragments of TikTok's rate-limit answers ("You are posting too fast. Take a rest.").
+RATE_LIMIT_MESSAGES = ["too fast", "take a rest"]
+# Uploads running at the same time across all accounts.
+MAX_CONCURRENT = int(os.getenv("TIKTOK_MAX_CONCURRENT_UPLOADS", "4"))
+
+
+def rate_limited(report):
+	status_msg = str(report.get("status_msg") or report.get("error") or "").lower()
+	return any(message in status_msg for message in RATE_LIMIT_MESSAGES)
+
+
+class RateLimiter:
+	"""Token bucket per TikTok account, learned from TikTok's answers and kept in CACHE_DIR/rate_limits.json.
+
+	Every accepted post raises the account's rate a little, every rate-limit answer halves it
+	and pauses the account, so each account settles just under the rate TikTok tolerates.
+
+	The worker, the monitor and one-off uploads may each have a limiter on the same file: every
+	change reloads it and is written back under a file lock, so no process spends a token another
+	one already took or overwrites what another one learned."""
+
+	def __init__(self, path=None):
+		self.path = path or os.path.join(os.getcwd(), Config.get().cache_dir, "rate_limits.json")
+		self._lock = threading.Lock()
+		self.buckets = self._load()
+
+	def _load(self):
+		return read_json(self.path, {})
+
+	def _save(self):
+		write_json(self.path, self.buckets)
+
+	@contextmanager
+	def _transaction(self):
+		# Buckets on disk were written last, they replace this process's copy account by account.
+		with self._lock, file_lock(self.path):
+			self.buckets.update(self._load())
+			yield
+			self._save()
+
+	def _bucket(self, account, now):
+		bucket = self.buckets.setdefault(account, {"rate": DEFAULT_POSTS_PER_HOUR, "tokens": BURST, "updated_at": now, "paused_until": 0, "strikes": 0})
+		bucket["tokens"] = min(BURST, bucket["tokens"] + (now - bucket["updated_at"]) * bucket["rate"] / 3600)
+		bucket["updated_at"] = now
+		return bucket
+
+	def delay(self, account):
+		"""Seconds until account may post again, 0 if it may post now"""
+		now = time.time()
+		with self._lock:
+			self.buckets.update(self._load())
+			bucket = self._bucket(account, now)
+			wait = max(0, bucket["paused_until"] - now)
+			if bucket["tokens"] < 1:
+				wait = max(wait, (1 - bucket["tokens"]) * 3600 / bucket["rate"])
+			return wait
+
+	def acquire(self, account):
+		"""Take a token for account if one is available now"""
+		now = time.time()
+		with self._transaction():
+			bucket = self._bucket(account, now)
+			if bucket["paused_until"] > now or bucket["tokens"] < 1:
+				return False
+			bucket["tokens"] -= 1
+		return True
+
+	def wait(self, account):
+		"""Block until account may post, then take the token"""
+		while not self.acquire(account):
+			time.sleep(min(self.delay(account), 60) or 0.1)
+
+	def record(self, account, report):
+		"""Learn from the report of an upload made with a token of account"""
+		now = time.time()
+		with self._transaction():
+			bucket = self._bucket(account, now)
+			if rate_limited(report):
+				bucket["rate"] = max(MIN_POSTS_PER_HOUR, bucket["rate"] / 2)
+				bucket["paused_until"] = now + THROTTLE_BACKOFF * 2 ** bucket["strikes"]
+				bucket["strikes"] += 1
+				bucket["tokens"] = 0
+				print(f"[-] {account} is being rate limited, {bucket['rate']:.1f} posts/hour from now, paused for {int(bucket['paused_until'] - now)}s")
+			elif report.get("status") == "published":
+				bucket["rate"] = min(MAX_POSTS_PER_HOUR, bucket["rate"] + RATE_STEP)
+				bucket["strikes"] = 0
+			elif report.get("status") == "unknown":
+				# The post got no answer and may be online, its token stays spent.
+				pass
+			else:
+				# Nothing was posted, give the token back.
+				bucket["tokens"] = min(BURST, bucket["tokens"] + 1)
+
+
+class UploadScheduler:
+	"""Runs upload jobs of many accounts in parallel, up to max_concurrent at a time.
+
+	Each account has its own queue and runs one job at a time, and only when its RateLimiter
+	bucket allows it: jobs of a throttled account wait while the other accounts keep going.
+	A job is a callable returning a report ({"status": "published", "status_msg": ...})."""
+
+	def __init__(self, max_concurrent=MAX_CONCURRENT, limiter=None):
+		self.max_concurrent = max_concurrent
+		self.limiter = limiter or RateLimiter()
+		self._queues = {}
+		self._running = set()
+		self._cond = threading.Condition()
+		self._stopped = False
+		self._executor = ThreadPoolExecutor(max_workers=max_concurrent)
+		self._dispatcher = threading.Thread(target=self._dispatch, name="upload-scheduler", daemon=True)
+		self._dispatcher.start()
+
+	def submit(self, account, func, *args, **kwargs):
+		"""Queue func(*args, **kwargs) for account, returns a Future of its report"""
+		future = Future()
+		with self._cond:
+			self._queues.setdefault(account, deque()).append((func, args, kwargs, future))
+			self._cond.notify()
+		return future
+
+	def pending(self):
+		"""Jobs queued or running"""
+		with self._cond:
+			return sum(len(queue) for queue in self._queues.values()) + len(self._running)
+
+	def _dispatch(self):
+		with self._cond:
+			while not self._stopped:
+				next_check = None
+				for account, queue in self._queues.items():
+					if len(self._running) >= self.max_concurrent:
+						break
+					if not queue or account in self._running:
+						continue
+					if not self.limiter.acquire(account):
+						delay = self.limiter.delay(account)
+						next_check = delay if next_check is None else min(next_check, delay)
+						continue
+					self._running.add(account)
+					self._executor.submit(self._run, account, *queue.popleft())
+				self._cond.wait(timeout=None if next_check is None else max(next_check, 0.1))
+
+	def _run(self, account, func, args, kwargs, future):
+		try:
+			report = func(*args, **kwargs) or {}
+			self.limiter.record(account, report)
+			future.set_result(report)
+		except BaseException as e:
+			self.limiter.record(account, {"status": "error"})
+			future.set_exception(e)
+		finally:
+			with self._cond:
+				self._running.discard(account)
+				self._cond.notify()
+
+	def join(self, poll_interval=1):
+		"""Block until every queued job has run"""
+		while self.pending():
+			time.sleep(poll_interval)
+
+	def shutdown(self, wait=True):
+		with self._cond:
+			self._stopped = True
+			self._cond.notify()
+		self._executor.shutdown(wait=wait)
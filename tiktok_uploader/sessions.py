@@ -0,0 +1,95 @@
+import os, threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Number of hosts (www.tiktok.com, upload hosts...) each session keeps a pool for,
+# and the number of keep-alive connections kept per host.
+POOL_CONNECTIONS = int(os.getenv("TIKTOK_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("TIKTOK_POOL_MAXSIZE", "10"))
+# Send part uploads over HTTP/2 when httpx[http2] is installed.
+USE_HTTP2 = os.getenv("TIKTOK_HTTP2", "0") == "1"
+
+_sessions = {}
+_upload_clients = {}
+_lock = threading.Lock()
+
+
+def get_session(account, proxy=None):
+	"""Return the shared requests.Session for (account, proxy), creating it on first use.
+	Connections to www.tiktok.com and the upload hosts stay open between uploads."""
+	key = (account, proxy or None)
+	with _lock:
+		session = _sessions.get(key)
+		if session is None:
+			session = requests.Session()
+			adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+			session.mount("https://", adapter)
+			session.mount("http://", adapter)
+			if proxy:
+				session.proxies = {
+					"http": proxy,
+					"https": proxy
+				}
+			_sessions[key] = session
+	return session
+
+
+def get_upload_client(account, proxy=None):
+	"""Client used for the part uploads, an HTTP/2 client multiplexing every part over one
+	connection when enabled and available, otherwise the account's pooled session"""
+	if not USE_HTTP2:
+		return get_session(account, proxy)
+	key = (account, proxy or None)
+	with _lock:
+		client = _upload_clients.get(key)
+		if client is None:
+			client = Http2Client.create(proxy)
+			if client is None:
+				return get_session(account, proxy)
+			_upload_clients[key] = client
+	return client
+
+
+def close_sessions():
+	with _lock:
+		for session in _sessions.values():
+			session.close()
+		for client in _upload_clients.values():
+			client.close()
+		_sessions.clear()
+		_upload_clients.clear()
+
+
+class Http2Client:
+	"""Minimal requests-like wrapper around an httpx HTTP/2 client, enough for part uploads"""
+
+	def __init__(self, client, httpx):
+		self._client = client
+		self._httpx = httpx
+
+	@staticmethod
+	def create(proxy=None):
+		try:
+			import httpx
+			import h2  # noqa: F401, only needed so httpx can negotiate HTTP/2
+		except ImportError:
+			print("[-] TIKTOK_HTTP2 is set but httpx[http2] is not installed, using HTTP/1.1")
+			return None
+		limits = httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE)
+		try:
+			client = httpx.Client(http2=True, limits=limits, proxy=proxy or None)
+		except TypeError:
+			# httpx < 0.26 only knows the older proxies argument.
+			client = httpx.Client(http2=True, limits=limits, proxies=proxy or None)
+		return Http2Client(client, httpx)
+
+	def post(self, url, headers=None, data=None, timeout=None):
+		if isinstance(data, memoryview):
+			data = bytes(data)
+		if isinstance(timeout, tuple):
+			timeout = self._httpx.Timeout(timeout[1], connect=timeout[0])
+		return self._client.post(url, headers=headers, content=data, timeout=timeout)
+
+	def close(self):
+		self._client.close()
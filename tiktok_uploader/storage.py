@@ -0,0 +1,70 @@
+import os, json, tempfile
+from contextlib import contextmanager
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+	import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+	"""Exclusive lock shared with other processes, held on path + ".lock" """
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path + ".lock", "a+") as f:
+		if fcntl:
+			fcntl.flock(f, fcntl.LOCK_EX)
+		else:
+			f.seek(0)
+			msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+		try:
+			yield
+		finally:
+			if fcntl:
+				fcntl.flock(f, fcntl.LOCK_UN)
+			else:
+				f.seek(0)
+				msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def try_lock(path):
+	"""Take an exclusive lock on path without waiting, returns the open file holding it (closing it
+	releases the lock, so does the process exiting) or None if another process holds it"""
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	f = open(path, "a+")
+	try:
+		if fcntl:
+			fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+		else:
+			f.seek(0)
+			msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+	except OSError:
+		f.close()
+		return None
+	return f
+
+
+def read_json(path, default=None):
+	"""Content of a JSON file, default if it is missing or unreadable"""
+	try:
+		with open(path, "r") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return default
+
+
+def write_json(path, data, **options):
+	"""Replace path with data in one step. The temporary file is unique to this call, so processes
+	writing the same cache file never write into each other's."""
+	directory = os.path.dirname(path)
+	os.makedirs(directory, exist_ok=True)
+	fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+	try:
+		with os.fdopen(fd, "w") as f:
+			json.dump(data, f, **options)
+		os.replace(tmp_path, path)
+	except BaseException:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+		raise
@@ -0,0 +1,54 @@
+import os, json, time, threading
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import write_json
+
+
+# How long resolved names are trusted before they are looked up again.
+USER_TTL = 7 * 24 * 3600
+HASHTAG_TTL = 24 * 3600
+
+
+class TagCache:
+	"""Persistent TTL cache of @mention user ids and verified #hashtag names, shared by every
+	upload in the process and kept on disk between runs"""
+
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, path):
+		self.path = path
+		self._lock = threading.Lock()
+		self.data = {"users": {}, "users_search": {}, "hashtags": {}}
+		if os.path.exists(path):
+			try:
+				with open(path, "r") as f:
+					self.data.update(json.load(f))
+			except (OSError, ValueError):
+				pass
+
+	@staticmethod
+	def get():
+		path = os.path.join(os.getcwd(), Config.get().cache_dir, "tag_cache.json")
+		with TagCache._instances_lock:
+			if path not in TagCache._instances:
+				TagCache._instances[path] = TagCache(path)
+			return TagCache._instances[path]
+
+	def lookup(self, kind, name):
+		"""Cached value for name, or None if it is missing or expired"""
+		ttl = HASHTAG_TTL if kind == "hashtags" else USER_TTL
+		with self._lock:
+			entry = self.data[kind].get(name.lower())
+		if entry and time.time() - entry[1] < ttl:
+			return entry[0]
+		return None
+
+	def store(self, kind, values):
+		"""Store {name: value} and write the cache back to disk"""
+		if not values:
+			return
+		now = int(time.time())
+		with self._lock:
+			for name, value in values.items():
+				self.data[kind][name.lower()] = [value, now]
+			write_json(self.path, self.data)
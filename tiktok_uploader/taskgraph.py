@@ -0,0 +1,81 @@
+import time, traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class TaskGraph:
+	"""Runs named steps on a thread pool, each one as soon as the steps it depends on are done.
+
+	A step is called with the results of its dependencies, in the order they were listed, and
+	fails by returning False or None. After a failure no new step is started, the running ones
+	are allowed to finish and run() returns None."""
+
+	def __init__(self, max_workers=4):
+		self.max_workers = max_workers
+		self.steps = {}
+		self.started = {}
+		self.finished = {}
+		self.failed = None
+		self.elapsed = 0
+
+	def add(self, name, func, deps=()):
+		self.steps[name] = (func, list(deps))
+
+	def run(self):
+		"""Run every step, returns {name: result} or None if a step failed"""
+		results = {}
+		pending = dict(self.steps)
+		running = {}
+		error = None
+		start = time.time()
+		with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+			while pending or running:
+				if self.failed is None:
+					for name, (func, deps) in list(pending.items()):
+						if all(dep in results for dep in deps):
+							del pending[name]
+							self.started[name] = time.time()
+							running[pool.submit(func, *[results[dep] for dep in deps])] = name
+				if not running:
+					break
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in done:
+					name = running.pop(future)
+					self.finished[name] = time.time()
+					try:
+						result = future.result()
+					except Exception as e:
+						traceback.print_exc()
+						error = error or e
+						result = None
+					if result is None or result is False:
+						self.failed = self.failed or name
+					else:
+						results[name] = result
+		self.elapsed = time.time() - start
+		if error is not None:
+			raise error
+		return None if self.failed else results
+
+	@property
+	def durations(self):
+		return {name: round(self.finished[name] - self.started[name], 3) for name in self.finished}
+
+	def critical_path(self):
+		"""Steps that set the total time, from first to last: walking back from the step that
+		finished last, through whichever of its dependencies finished last"""
+		if not self.finished:
+			return []
+		name = max(self.finished, key=self.finished.get)
+		path = [name]
+		while True:
+			deps = [dep for dep in self.steps[name][1] if dep in self.finished]
+			if not deps:
+				break
+			name = max(deps, key=self.finished.get)
+			path.append(name)
+		return path[::-1]
+
+	def describe_critical_path(self):
+		durations = self.durations
+		steps = " > ".join(f"{name} {durations[name]:.2f}s" for name in self.critical_path())
+		return f"{steps} (total {self.elapsed:.2f}s)"
@@ -0,0 +1,121 @@
+// Listen.js
+// Long-lived signing server: keeps one Chromium and a warm pool of signer pages per
+// user agent, so each sign request only costs a page.evaluate instead of a browser launch.
+const Signer = require("./index");
+const http = require("http");
+const { chromium } = require("playwright-chromium");
+
+const HOST = process.env.SIGNER_HOST || "127.0.0.1";
+const PORT = parseInt(process.env.SIGNER_PORT || "8080", 10);
+const POOL_SIZE = parseInt(process.env.SIGNER_POOL_SIZE || "2", 10);
+const SIGN_TIMEOUT = parseInt(process.env.SIGNER_TIMEOUT || "15000", 10);
+
+let browser = null;
+// user agent -> { idle: [Signer], waiting: [resolve], created: n }
+const pools = new Map();
+
+function withTimeout(promise, ms) {
+  let timer;
+  return Promise.race([
+    promise,
+    new Promise((_, reject) => {
+      timer = setTimeout(() => reject(new Error("sign timeout")), ms);
+    }),
+  ]).finally(() => clearTimeout(timer));
+}
+
+async function acquire(userAgent) {
+  let pool = pools.get(userAgent);
+  if (!pool) {
+    pool = { idle: [], waiting: [], created: 0 };
+    pools.set(userAgent, pool);
+  }
+  if (pool.idle.length) {
+    return pool.idle.pop();
+  }
+  if (pool.created < POOL_SIZE) {
+    pool.created++;
+    try {
+      const signer = new Signer(null, userAgent, browser);
+      await signer.init();
+      return signer;
+    } catch (err) {
+      pool.created--;
+      throw err;
+    }
+  }
+  return new Promise((resolve) => pool.waiting.push(resolve));
+}
+
+function release(userAgent, signer) {
+  const pool = pools.get(userAgent);
+  const next = pool.waiting.shift();
+  if (next) {
+    next(signer);
+  } else {
+    pool.idle.push(signer);
+  }
+}
+
+async function discard(userAgent, signer) {
+  const pool = pools.get(userAgent);
+  pool.created--;
+  try {
+    await signer.context.close();
+  } catch (err) {}
+}
+
+async function sign(url, userAgent) {
+  const signer = await acquire(userAgent);
+  try {
+    const sign = await withTimeout(signer.sign(url), SIGN_TIMEOUT);
+    const navigator = await withTimeout(signer.navigator(), SIGN_TIMEOUT);
+    release(userAgent, signer);
+    return { ...sign, navigator: navigator };
+  } catch (err) {
+    // A page that failed or hung is not trusted again.
+    await discard(userAgent, signer);
+    throw err;
+  }
+}
+
+(async function main() {
+  browser = await chromium.launch(new Signer().options);
+
+  const server = http.createServer((request, response) => {
+    if (request.method === "GET" && request.url === "/health") {
+      response.writeHead(200, { "Content-Type": "application/json" });
+      response.end(JSON.stringify({ status: "ok" }));
+      return;
+    }
+    if (request.method !== "POST" || request.url !== "/signature") {
+      response.statusCode = 404;
+      response.end();
+      return;
+    }
+
+    let body = "";
+    request.on("data", (chunk) => {
+      body += chunk;
+    });
+    request.on("end", async () => {
+      try {
+        const { url, user_agent } = JSON.parse(body);
+        const data = await sign(url, user_agent || new Signer().userAgent);
+        response.writeHead(200, { "Content-Type": "application/json" });
+        response.end(JSON.stringify({ status: "ok", data: data }));
+      } catch (err) {
+        console.error(err);
+        response.writeHead(500, { "Content-Type": "application/json" });
+        response.end(JSON.stringify({ status: "error", error: String(err) }));
+      }
+    });
+  });
+
+  server.listen(PORT, HOST, () => {
+    console.log(`TikTok Signature server started on ${HOST}:${PORT}`);
+  });
+})().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -1,19 +1,27 @@
 import time, requests, datetime, hashlib, hmac, random, zlib, json, datetime
 import requests, zlib, json, time, subprocess, string, secrets, os, sys
-from fake_useragent import FakeUserAgentError, UserAgent
 from requests_auth_aws_sigv4 import AWSSigV4
 from tiktok_uploader.cookies import load_cookies_from_file
-from tiktok_uploader.Browser import Browser
 from tiktok_uploader.bot_utils import *
-from tiktok_uploader import Config, Video, eprint
+from tiktok_uploader.transfer import PartUploader, choose_chunk_size, select_upload_node
+from tiktok_uploader.journal import UploadJournal
+from tiktok_uploader.xbogus import generate_x_bogus
+from tiktok_uploader.sessions import get_session, get_upload_client
+from tiktok_uploader.profiles import AccountProfile
+from tiktok_uploader.taskgraph import TaskGraph
+from tiktok_uploader.verifier import PostVerifier
+from tiktok_uploader.planner import schedule_time_for
+from tiktok_uploader import Config, eprint
 from dotenv import load_dotenv
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
 
 
 # Load environment variables
 load_dotenv()
 
-# Constants
-_UA = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/68.0.3440.106 Safari/537.36'
+# Videos of a batch uploaded at the same time, on top of the project and signing steps.
+BATCH_WORKERS = 4
 
 
 def login(login_name: str):
@@ -26,6 +34,7 @@ def login(login_name: str):
 		print("Unnecessary login: session already saved!")
 		return session_cookie["value"]
 
+	from tiktok_uploader.Browser import Browser
 	browser = Browser.get()
 	response = browser.driver.get(os.getenv("TIKTOK_LOGIN_URL"))
 
@@ -46,27 +55,92 @@ def login(login_name: str):
 
 
 # Local Code...
-def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, allow_duet=0, allow_stitch=0, visibility_type=0, brand_organic_type=0, branded_content_type=0, ai_label=0, proxy=None):
-	try:
-		user_agent = UserAgent().random
-	except FakeUserAgentError as e:
-		user_agent = _UA
-		print("[-] Could not get random user agent, using default")
-
-	cookies = load_cookies_from_file(f"tiktok_session-{session_user}")
-	session_id = next((c["value"] for c in cookies if c["name"] == 'sessionid'), None)
-	dc_id = next((c["value"] for c in cookies if c["name"] == 'tt-target-idc'), None)
-	
+def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, allow_duet=0, allow_stitch=0, visibility_type=0, brand_organic_type=0, branded_content_type=0, ai_label=0, proxy=None, report=None, publish_at=None):
+	# report, when given, is filled with the ids, TikTok status and per-phase timings of this upload.
+	# publish_at (a timestamp) schedules the post at that time instead of schedule_time seconds after it is sent.
+	report = {} if report is None else report
+	if publish_at:
+		schedule_time = schedule_time_for(publish_at)
+	opened = open_session(session_user, proxy)
+	if opened is None:
+		sys.exit(1)
+	profile, user_agent, session = opened
+
+	print("Uploading video...")
+	if not validate_upload(title, schedule_time, visibility_type):
+		return False
+
+	# A journal left by an interrupted run lets us skip every phase that already completed.
+	video_path = os.path.join(os.getcwd(), Config.get().videos_dir, video)
+	journal = UploadJournal.open(session_user, video_path)
+	upload_client = get_upload_client(session_user, proxy)
+
+	# Steps that do not depend on each other run concurrently: the project is created while the
+	# upload is authorised, and the warm-up and tag conversion happen during the transfer. The post
+	# query is only signed when the post is sent, so a long transfer cannot leave it stale.
+	graph = TaskGraph()
+	graph.add("create", lambda: create_project(session, journal, report))
+	graph.add("auth", lambda: authorize_upload(session))
+	graph.add("apply", lambda credentials: apply_upload(session, credentials, video_path, journal, report), ["auth"])
+	graph.add("transfer", lambda node: transfer_parts(upload_client, video_path, node, journal, report=report), ["apply"])
+	graph.add("finish", lambda node, crcs: finish_upload(session, node, crcs, journal), ["apply", "transfer"])
+	graph.add("commit", lambda credentials, node, finished: commit_upload(session, credentials, node, journal), ["auth", "apply", "finish"])
+	graph.add("warmup", lambda: warm_up(session, profile, user_agent))
+	graph.add("tags", lambda: convert_tags(title, session))
+	graph.add("post", lambda project, node, committed, tags, ms_token: publish_video(
+		session, profile, journal, user_agent, project[0], node["video_id"], title, tags, ms_token, schedule_time, report, publish_at
+	), ["create", "apply", "commit", "tags", "warmup"])
+
+	results = graph.run()
+	report["timings"] = graph.durations
+	report["critical_path"] = graph.critical_path()
+	print(f"[+] Critical path: {graph.describe_critical_path()}")
+	if results is None:
+		return False
+	return True
+
+
+def open_session(session_user, proxy=None, quiet=False):
+	"""(profile, user_agent, session) for a logged in account, None if no session is saved.
+	quiet leaves out the login banner, for background checks that open sessions repeatedly."""
+	# The profile keeps a stable user agent, the session cookies and the last msToken between runs.
+	profile = AccountProfile.load(session_user)
+	user_agent = profile.user_agent
+	session_id, dc_id = profile.session_cookies()
+
 	if not session_id:
 		eprint("No cookie with Tiktok session id found: use login to save session id")
-		sys.exit(1)
+		return None
 	if not dc_id:
+		# The first response usually assigns the real one, it is then saved with the session.
 		print("[WARNING]: Please login, tiktok datacenter id must be allocated, or may fail")
+		print("[WARNING]: Using useast2a until TikTok assigns a datacenter")
 		dc_id = "useast2a"
-	print("User successfully logged in.")
-	print(f"Tiktok Datacenter Assigned: {dc_id}")
-	
-	print("Uploading video...")
+	if not quiet:
+		print("User successfully logged in.")
+		print(f"Tiktok Datacenter Assigned: {dc_id}")
+
+	# Sessions are shared per account and proxy so connections are reused between uploads.
+	session = get_session(session_user, proxy)
+	session.cookies.set("sessionid", session_id, domain=".tiktok.com")
+	session.cookies.set("tt-target-idc", dc_id, domain=".tiktok.com")
+	session.verify = True
+
+	headers = {
+		'User-Agent': user_agent,
+		'Accept': 'application/json, text/plain, */*',
+	}
+	session.headers.update(headers)
+
+	# TikTok moves accounts between datacenters with a Set-Cookie, the new one is saved for the next runs.
+	def track_dc(r, *args, **kwargs):
+		profile.update_dc(next((c.value for c in r.cookies if c.name == "tt-target-idc"), None))
+		return r
+	session.hooks["response"] = [hook for hook in session.hooks["response"] if getattr(hook, "__name__", None) != "track_dc"] + [track_dc]
+	return profile, user_agent, session
+
+
+def validate_upload(title, schedule_time=0, visibility_type=0):
 	# Parameter validation,
 	if schedule_time and (schedule_time > 864000 or schedule_time < 900):
 		print("[-] Cannot schedule video in more than 10 days or less than 20 minutes")
@@ -79,85 +153,225 @@ def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, a
 		return False
 
 	# Check video length - 1 minute max, takes too long to run this.
+	return True
 
 
-	# Creating Session
-	session = requests.Session()
-	session.cookies.set("sessionid", session_id, domain=".tiktok.com")
-	session.cookies.set("tt-target-idc", dc_id, domain=".tiktok.com")
-	session.verify = True
+def create_project(session, journal, report):
+	"""project/create, returns (creation_id, project_id)"""
+	if journal is not None and journal.get("project_id"):
+		creation_id = journal.get("creation_id")
+		project_id = journal.get("project_id")
+	else:
+		creation_id = generate_random_string(21, True)
+		project_url = f"https://www.tiktok.com/api/v1/web/project/create/?creation_id={creation_id}&type=1&aid=1988"
+		r = session.post(project_url)
 
-	headers = {
-		'User-Agent': user_agent,
-		'Accept': 'application/json, text/plain, */*',
+		if not assert_success(project_url, r):
+			return False
+
+		# get project_id
+		project_id = r.json()["project"]["project_id"]
+		if journal is not None:
+			# Without an expiry the journal is dropped on reopen, a crash before apply would lose the project.
+			if not journal.get("expires_at"):
+				journal.set_credentials_expiry()
+			journal.update(creation_id=creation_id, project_id=project_id)
+	report["creation_id"] = creation_id
+	return creation_id, project_id
+
+
+def authorize_upload(session):
+	"""video/upload/auth, returns the temporary credentials used to sign the upload requests.
+	They are never journaled, a resumed upload asks for new ones."""
+	url = "https://www.tiktok.com/api/v1/video/upload/auth/?aid=1988"
+	r = session.get(url)
+	if not assert_success(url, r):
+		return False
+
+	return {
+		"access_key_id": r.json()["video_token_v5"]["access_key_id"],
+		"secret_access_key": r.json()["video_token_v5"]["secret_acess_key"],
+		"session_token": r.json()["video_token_v5"]["session_token"],
 	}
-	session.headers.update(headers)
 
-	# Setting proxy if provided.
-	if proxy:
-		session.proxies = {
-			"http": proxy,
-			"https": proxy
-		}
 
-	creation_id = generate_random_string(21, True)
-	project_url = f"https://www.tiktok.com/api/v1/web/project/create/?creation_id={creation_id}&type=1&aid=1988"
-	r = session.post(project_url)
+def aws_sigv4(credentials):
+	return AWSSigV4(
+		"vod",
+		region="ap-singapore-1",
+		aws_access_key_id=credentials["access_key_id"],
+		aws_secret_access_key=credentials["secret_access_key"],
+		aws_session_token=credentials["session_token"],
+	)
+
 
-	if not assert_success(project_url, r):
+def apply_upload(session, credentials, video_path, journal, report=None):
+	"""ApplyUploadInner, returns the upload node the parts are sent to"""
+	if journal.reached("applied"):
+		node = {name: journal.get(name) for name in ("video_id", "store_uri", "video_auth", "upload_host", "session_key", "upload_id", "chunk_size")}
+	else:
+		file_size = os.stat(video_path).st_size
+		url = f"https://www.tiktok.com/top/v1?Action=ApplyUploadInner&Version=2020-11-19&SpaceName=tiktok&FileType=video&IsInner=1&FileSize={file_size}&s=g158iqx8434"
+
+		r = session.get(url, auth=aws_sigv4(credentials))
+		if not assert_success(url, r):
+			return False
+
+		# When several nodes are offered, the fastest one measured from here is used.
+		upload_node = select_upload_node(session, r.json()["Result"]["InnerUploadAddress"]["UploadNodes"], file_size)
+		node = {
+			"video_id": upload_node["Vid"],
+			"store_uri": upload_node["StoreInfos"][0]["StoreUri"],
+			"video_auth": upload_node["StoreInfos"][0]["Auth"],
+			"upload_host": upload_node["UploadHost"],
+			"session_key": upload_node["SessionKey"],
+			"upload_id": str(uuid.uuid4()),
+			"chunk_size": choose_chunk_size(upload_node["UploadHost"]),
+		}
+		journal.set_credentials_expiry()
+		journal.update("applied", **node)
+	if report is not None:
+		report["video_id"] = node["video_id"]
+	return node
+
+
+def transfer_parts(upload_client, video_path, node, journal, pool=None, report=None):
+	"""Send the parts that are not in the journal yet, returns every part CRC in order.
+	pool is an executor shared between uploads to send the parts on (see PartUploader).
+	report, when given, gets the throughput of the parts actually sent."""
+	if journal.reached("transferred"):
+		parts = journal.parts
+		return [parts[n] for n in sorted(parts)]
+
+	# Parts are streamed from disk and sent in parallel, failed parts are retried on their own.
+	uploader = PartUploader(upload_client, node["upload_host"], node["store_uri"], node["video_auth"], node["upload_id"], pool=pool)
+	crcs = uploader.upload(video_path, node["chunk_size"], completed=journal.parts, on_part=journal.mark_part)
+	if crcs is None:
 		return False
+	if report is not None and uploader.throughput:
+		report["throughput"] = uploader.throughput
+	journal.update("transferred")
+	return crcs
+
+
+def upload_rejected(r):
+	"""Whether a finish or commit answer refuses the upload itself (an unknown or expired upload id,
+	a CRC mismatch), so resuming it cannot work. Transport errors, 5xx and throttling keep the journal."""
+	return r.status_code in (400, 404, 410)
+
 
-	# get project_id
-	project_id = r.json()["project"]["project_id"]
-	video_id, session_key, upload_id, crcs, upload_host, store_uri, video_auth, aws_auth = upload_to_tiktok(video, session)
+def finish_upload(session, node, crcs, journal):
+	if journal.reached("finished"):
+		return True
 
-	url = f"https://{upload_host}/{store_uri}?uploadID={upload_id}&phase=finish&uploadmode=part"
+	url = f"https://{node['upload_host']}/{node['store_uri']}?uploadID={node['upload_id']}&phase=finish&uploadmode=part"
 	headers = {
-		"Authorization": video_auth,
+		"Authorization": node["video_auth"],
 		"Content-Type": "text/plain;charset=UTF-8",
 	}
 	data = ",".join([f"{i + 1}:{crcs[i]}" for i in range(len(crcs))])
 
-	if proxy:
-		r = requests.post(url, headers=headers, data=data, proxies=session.proxies)
-		if not assert_success(url, r):
-			return False
-	else:
-		r = requests.post(url, headers=headers, data=data)
-		if not assert_success(url, r):
-			return False
+	r = session.post(url, headers=headers, data=data)
+	if not assert_success(url, r):
+		if upload_rejected(r):
+			journal.discard()
+		return False
+	journal.update("finished")
+	return True
+
+
+def commit_upload(session, credentials, node, journal):
+	if journal.reached("committed"):
+		return True
 	#
 	# url = f"https://www.tiktok.com/top/v1?Action=CommitUploadInner&Version=2020-11-19&SpaceName=tiktok"
 	# data = '{"SessionKey":"' + session_key + '","Functions":[{"name":"GetMeta"}]}'
 
 	# ApplyUploadInner
 	url = f"https://www.tiktok.com/top/v1?Action=CommitUploadInner&Version=2020-11-19&SpaceName=tiktok"
-	data = '{"SessionKey":"' + session_key + '","Functions":[{"name":"GetMeta"}]}'
+	data = '{"SessionKey":"' + node["session_key"] + '","Functions":[{"name":"GetMeta"}]}'
 
-	r = session.post(url, auth=aws_auth, data=data)
+	r = session.post(url, auth=aws_sigv4(credentials), data=data)
 	if not assert_success(url, r):
+		if upload_rejected(r):
+			journal.discard()
 		return False
+	journal.update("committed")
+	return True
 
-	# publish video
-	url = "https://www.tiktok.com"
-	headers = {
-		"user-agent": user_agent
+
+def warm_up(session, profile, user_agent):
+	"""Make sure the session has an msToken, the warm-up request is only sent when the cached one is stale"""
+	ms_token = profile.ms_token
+	if ms_token and not session.cookies.get("msToken"):
+		session.cookies.set("msToken", ms_token, domain=".tiktok.com")
+	if not ms_token:
+		url = "https://www.tiktok.com"
+		headers = {
+			"user-agent": user_agent
+		}
+
+		r = session.head(url, headers=headers)
+		if not assert_success(url, r):
+			return False
+		profile.remember_ms_token(session.cookies)
+	return session.cookies.get("msToken") or ""
+
+
+def post_query(ms_token):
+	return {
+		"app_name": "tiktok_web",
+		"channel": "tiktok_web",
+		"device_platform": "web",
+		"aid": 1988,
+		"msToken": ms_token or None,
 	}
 
-	r = session.head(url, headers=headers)
-	if not assert_success(url, r):
+
+def sign_post_query(ms_token, user_agent):
+	"""project/post query signed with the in-process X-Bogus"""
+	project_post_dict = post_query(ms_token)
+	# Sign exactly the query requests will send, which drops params set to None.
+	query = urlencode({k: v for k, v in project_post_dict.items() if v is not None})
+	project_post_dict["X-Bogus"] = generate_x_bogus(query, user_agent)
+	return project_post_dict
+
+
+def publish_video(session, profile, journal, user_agent, creation_id, video_id, title, tags, ms_token, schedule_time=0, report=None, publish_at=None):
+	"""project/post, publishes (or schedules) the uploaded video.
+	When the outcome of the post is not known, report["status"] is "unknown" and the post is left
+	to PostVerifier, it is never sent a second time."""
+	report = {} if report is None else report
+	if journal.reached("posting"):
+		print(f"[-] The post of {creation_id} was already sent once, PostVerifier reports whether it went through")
+		report["status"] = "unknown"
+		PostVerifier.get().track(profile.account, creation_id, [video_id])
 		return False
+	markup_text, text_extra = tags
+	data = post_payload(creation_id, [(video_id, title, text_extra)], schedule_time, publish_at)
+	journal.update("posting")
+	try:
+		posted = post_project(session, profile, user_agent, data, ms_token, schedule_time, report)
+	except requests.exceptions.ConnectTimeout:
+		# The request never reached TikTok, posting again is safe.
+		journal.rewind("committed")
+		raise
+	if posted:
+		journal.discard()
+	elif report.get("status") != "unknown":
+		journal.rewind("committed")
+		return False
+	PostVerifier.get().track(profile.account, creation_id, [video_id])
+	return posted
 
-	headers = {
-		"content-type": "application/json",
-		"user-agent": user_agent
-	}
+
+def post_payload(creation_id, videos, schedule_time=0, publish_at=None):
+	"""project/post body for one or more uploaded videos, given as (video_id, title, text_extra).
+	publish_at, when given, is the time the post is planned at and takes over from schedule_time."""
 	brand = ""
 
 	if brand and brand[-1] == ",":
 		brand = brand[:-1]
-	markup_text, text_extra = convert_tags(title, session)
-
 
 
 	# Added for showing history of data changes...
@@ -264,10 +478,11 @@ def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, a
 					"allow_comment": 1
 				}
 			}
+			for video_id, title, text_extra in videos
 		],
 		"single_post_req_list": [
 			{
-				"batch_index": 0,
+				"batch_index": batch_index,
 				"video_id": video_id,
 				"is_long_video": 0,
 				"single_post_feature_info": {
@@ -278,57 +493,98 @@ def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, a
 					"poster_delay": 0,
 				}
 			}
+			for batch_index, (video_id, title, text_extra) in enumerate(videos)
 		]
 	}
 
 
+	# A planned time only becomes an offset now, however long the upload before the post took.
+	now = int(time.time())
+	if publish_at:
+		schedule_time = schedule_time_for(publish_at, now)
 	# Add schedule_time to the payload if it's provided
 	if schedule_time > 0:
-		data["feature_common_info_list"][0]["schedule_time"] = schedule_time + int(time.time())
+		for feature_info in data["feature_common_info_list"]:
+			feature_info["schedule_time"] = schedule_time + now
 	
-	uploaded = False
-	while True:
-		mstoken = session.cookies.get("msToken")
-		# xbogus = subprocess_jsvmp(os.path.join(os.getcwd(), "tiktok_uploader", "./x-bogus.js"), user_agent, f"app_name=tiktok_web&channel=tiktok_web&device_platform=web&aid=1988&msToken={mstoken}")
-		# /tiktok/web/project/post/v1/
-		js_path = os.path.join(os.getcwd(), "tiktok_uploader", "tiktok-signature", "browser.js")
-		sig_url = f"https://www.tiktok.com/api/v1/web/project/post/?app_name=tiktok_web&channel=tiktok_web&device_platform=web&aid=1988&msToken={mstoken}"
-		signatures = subprocess_jsvmp(js_path, user_agent, sig_url)
-		if signatures is None:
-			print("[-] Failed to generate signatures")
-			return False
+	return data
 
-		try:
-			tt_output = json.loads(signatures)["data"]
-		except (json.JSONDecodeError, KeyError) as e:
-			print(f"[-] Failed to parse signature data: {str(e)}")
-			return False
 
-		project_post_dict = {
-			"app_name": "tiktok_web",
-			"channel": "tiktok_web",
-			"device_platform": "web",
-			"aid": 1988,
-			"msToken": mstoken,
-			"X-Bogus": tt_output["x-bogus"],
-			"_signature": tt_output["signature"],
-			# "X-TT-Params": tt_output["x-tt-params"],  # not needed rn.
-		}
+def signature_rejected(r):
+	"""Whether a project/post answer is TikTok refusing the request's signature, rather than the post:
+	a 4xx, or a 200 with an empty body"""
+	return 400 <= r.status_code < 500 or (r.status_code == 200 and not r.text.strip())
+
+
+def post_project(session, profile, user_agent, data, ms_token, schedule_time=0, report=None):
+	"""Send a signed project/post request, returns True once TikTok accepted it"""
+	report = {} if report is None else report
+	headers = {
+		"content-type": "application/json",
+		"user-agent": user_agent
+	}
+
+	uploaded = False
+	# The query is signed in-process first, the browser signer is only used if TikTok rejects that signature.
+	for use_browser in (False, True):
+		if use_browser:
+			mstoken = session.cookies.get("msToken")
+			project_post_dict = post_query(mstoken)
+			# /tiktok/web/project/post/v1/
+			js_path = os.path.join(os.getcwd(), "tiktok_uploader", "tiktok-signature", "browser.js")
+			sig_url = f"https://www.tiktok.com/api/v1/web/project/post/?app_name=tiktok_web&channel=tiktok_web&device_platform=web&aid=1988&msToken={mstoken}"
+			signatures = generate_signatures(js_path, user_agent, sig_url)
+			if signatures is None:
+				print("[-] Failed to generate signatures")
+				return False
+
+			try:
+				tt_output = json.loads(signatures)["data"]
+			except (json.JSONDecodeError, KeyError) as e:
+				print(f"[-] Failed to parse signature data: {str(e)}")
+				return False
+
+			project_post_dict["X-Bogus"] = tt_output["x-bogus"]
+			project_post_dict["_signature"] = tt_output["signature"]
+			# project_post_dict["X-TT-Params"] = tt_output["x-tt-params"]  # not needed rn.
+		else:
+			# Signed here rather than ahead of the upload, X-Bogus carries the time it was made at.
+			project_post_dict = sign_post_query(session.cookies.get("msToken") or ms_token, user_agent)
 
 		# url = f"https://www.tiktok.com/api/v1/web/project/post/"
 		url = f"https://www.tiktok.com/tiktok/web/project/post/v1/"
-		r = session.request("POST", url, params=project_post_dict, data=json.dumps(data), headers=headers)
-		if not assertSuccess(url, r):
-			print("[-] Published failed, try later again")
-			printError(url, r)
+		try:
+			r = session.request("POST", url, params=project_post_dict, data=json.dumps(data), headers=headers)
+		except requests.exceptions.ConnectTimeout:
+			raise
+		except requests.exceptions.RequestException as e:
+			# TikTok may have accepted the post before the answer was lost, it must not be sent again.
+			print(f"[-] No answer to the post ({e.__class__.__name__}), its outcome is left to PostVerifier")
+			report["status"], report["error"] = "unknown", str(e) or e.__class__.__name__
 			return False
-
-		if r.json()["status_code"] == 0:
+		if not use_browser and signature_rejected(r):
+			print("[-] Native signature rejected, retrying with browser signer...")
+			continue
+		try:
+			body = r.json() if r.status_code == 200 else {}
+		except ValueError:
+			body = {}
+		if r.status_code == 200 and isinstance(body, dict):
+			report["status_code"] = body.get("status_code")
+			report["status_msg"] = body.get("status_msg")
+		if r.status_code == 200 and isinstance(body, dict) and body.get("status_code") == 0:
 			print(f"Published successfully {'| Scheduled for ' + str(schedule_time) if schedule_time else ''}")
 			uploaded = True
+			profile.remember_ms_token(session.cookies)
 			break
+		# Any other answer was about the post itself (posting too fast, a rejected video, a bad
+		# schedule), sending it again through the browser signer could publish it twice.
+		if not assertSuccess(url, r):
+			print("[-] Published failed, try later again")
+			printError(url, r)
+			return False
 		else:
-			print("[-] Publish failed to Tiktok, trying again...")
+			print(f"[-] Publish failed to Tiktok: {report.get('status_msg')}")
 			printError(url, r)
 			return False
 		#
@@ -346,6 +602,7 @@ def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, a
 		print("[-] Could not upload video")
 		return False
 	# Check if video uploaded successfully (Tiktok has changed endpoint for this)
+	# Posts are now confirmed in the background by PostVerifier, without blocking the upload.
 	# url = f"https://www.tiktok.com/api/v1/web/project/list/?aid=1988"
 	#
 	# r = session.get(url)
@@ -364,61 +621,122 @@ def upload_video(session_user, video, title, schedule_time=0, allow_comment=1, a
 	# 		print("[-] Video could not be uploaded")
 	# 		print("Response ", j)
 
+	return True
+
+
+def upload_batch(session_user, videos, schedule_time=0, visibility_type=0, proxy=None, report=None):
+	"""Upload several videos and publish them together in one signed project/post request.
+
+	videos are (video, title) pairs. Returns one result per video, {"video", "title", "status", "error"},
+	with a status of published, failed (its upload or the post failed), unknown (the post got no answer,
+	PostVerifier settles it) or invalid (rejected before upload).
+	A video that fails to upload is left out of the post, the others are still published."""
+	report = {} if report is None else report
+	results = [{"video": video, "title": title, "status": None, "error": None} for video, title in videos]
+	opened = open_session(session_user, proxy)
+	if opened is None:
+		# Called in-process by the worker and the planner, only the CLI exits on failure.
+		for result in results:
+			result.update(status="invalid", error="no session")
+		report["results"] = results
+		return results
+	profile, user_agent, session = opened
+
+	items = []
+	for result in results:
+		video_path = os.path.join(os.getcwd(), Config.get().videos_dir, result["video"])
+		if not os.path.exists(video_path):
+			result.update(status="invalid", error="video does not exist")
+		elif not validate_upload(result["title"], schedule_time, visibility_type):
+			result.update(status="invalid", error="invalid title or schedule")
+		else:
+			items.append(result)
+	if not items:
+		return results
 
-def upload_to_tiktok(video_file, session):
-	url = "https://www.tiktok.com/api/v1/video/upload/auth/?aid=1988"
-	r = session.get(url)
-	if not assert_success(url, r):
-		return False
-
-	aws_auth = AWSSigV4(
-		"vod",
-		region="ap-singapore-1",
-		aws_access_key_id=r.json()["video_token_v5"]["access_key_id"],
-		aws_secret_access_key=r.json()["video_token_v5"]["secret_acess_key"],
-		aws_session_token=r.json()["video_token_v5"]["session_token"],
-	)
-	with open(os.path.join(os.getcwd(), Config.get().videos_dir, video_file), "rb") as f:
-		video_content = f.read()
-	file_size = len(video_content)
-	url = f"https://www.tiktok.com/top/v1?Action=ApplyUploadInner&Version=2020-11-19&SpaceName=tiktok&FileType=video&IsInner=1&FileSize={file_size}&s=g158iqx8434"
+	print(f"Uploading {len(items)} videos...")
+	upload_client = get_upload_client(session_user, proxy)
 
-	r = session.get(url, auth=aws_auth)
-	if not assert_success(url, r):
+	def upload_item(result):
+		video_path = os.path.join(os.getcwd(), Config.get().videos_dir, result["video"])
+		try:
+			journal = UploadJournal.open(session_user, video_path)
+			if journal.reached("posting"):
+				# An earlier post of this video got no answer and may have published it.
+				result.update(status="unknown", error="already posted once")
+				return None
+			credentials = authorize_upload(session)
+			node = credentials and apply_upload(session, credentials, video_path, journal)
+			crcs = node and transfer_parts(upload_client, video_path, node, journal)
+			if not crcs or not finish_upload(session, node, crcs, journal) or not commit_upload(session, credentials, node, journal):
+				result.update(status="failed", error="upload failed")
+				return None
+			markup_text, text_extra = convert_tags(result["title"], session)
+		except Exception as e:
+			result.update(status="failed", error=str(e) or e.__class__.__name__)
+			return None
+		result["video_id"] = node["video_id"]
+		return journal, (node["video_id"], result["title"], text_extra)
+
+	# Every video is uploaded while the project is created and the session warmed up, once for the whole batch.
+	with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+		project = pool.submit(create_project, session, None, report)
+		ms_token = pool.submit(warm_up, session, profile, user_agent)
+		uploads = [(result, pool.submit(upload_item, result)) for result in items]
+		uploaded = [(result, future.result()) for result, future in uploads]
+		uploaded = [(result, item) for result, item in uploaded if item]
+		project, ms_token = project.result(), ms_token.result()
+
+	posted = False
+	if uploaded and project and ms_token is not False:
+		data = post_payload(project[0], [item[1] for result, item in uploaded], schedule_time)
+		for result, (journal, _) in uploaded:
+			journal.update("posting")
+		try:
+			posted = post_project(session, profile, user_agent, data, ms_token, schedule_time, report)
+		except requests.exceptions.ConnectTimeout:
+			pass
+	unknown = not posted and report.get("status") == "unknown"
+	for result, (journal, _) in uploaded:
+		if posted:
+			result["status"] = "published"
+			journal.discard()
+		elif unknown:
+			# The videos stay journaled at "posting", they are not posted again.
+			result.update(status="unknown", error="no answer to the post")
+		else:
+			journal.rewind("committed")
+			result.update(status="failed", error="post failed")
+	if posted or unknown:
+		PostVerifier.get().track(session_user, project[0], [result["video_id"] for result, _ in uploaded])
+
+	report["results"] = results
+	print(f"[+] Batch: {sum(r['status'] == 'published' for r in results)}/{len(results)} videos published")
+	return results
+
+
+def upload_to_tiktok(video_file, session, journal=None, upload_client=None):
+	"""Authorise, apply and transfer a video, without creating a project or publishing it.
+	Without a journal, one is only kept until the transfer completed, so a failed call can resume."""
+	video_path = os.path.join(os.getcwd(), Config.get().videos_dir, video_file)
+	owned = journal is None
+	if owned:
+		journal = UploadJournal.open("", video_path)
+
+	credentials = authorize_upload(session)
+	if not credentials:
 		return False
+	node = apply_upload(session, credentials, video_path, journal)
+	if not node:
+		return False
+	crcs = transfer_parts(upload_client or session, video_path, node, journal)
+	if not crcs:
+		return False
+	if owned:
+		# The caller finishes the upload itself, nothing is left for the journal to resume.
+		journal.discard()
 
-	# upload chunks
-	upload_node = r.json()["Result"]["InnerUploadAddress"]["UploadNodes"][0]
-	video_id = upload_node["Vid"]
-	store_uri = upload_node["StoreInfos"][0]["StoreUri"]
-	video_auth = upload_node["StoreInfos"][0]["Auth"]
-	upload_host = upload_node["UploadHost"]
-	session_key = upload_node["SessionKey"]
-	chunk_size = 5242880
-	chunks = []
-	i = 0
-	while i < file_size:
-		chunks.append(video_content[i: i + chunk_size])
-		i += chunk_size
-	crcs = []
-	upload_id = str(uuid.uuid4())
-	for i in range(len(chunks)):
-		chunk = chunks[i]
-		crc = crc32(chunk)
-		crcs.append(crc)
-		url = f"https://{upload_host}/{store_uri}?partNumber={i + 1}&uploadID={upload_id}&phase=transfer"
-		headers = {
-			"Authorization": video_auth,
-			"Content-Type": "application/octet-stream",
-			"Content-Disposition": 'attachment; filename="undefined"',
-			"Content-Crc32": crc,
-		}
-
-		r = session.post(url, headers=headers, data=chunk)
-
-	return video_id, session_key, upload_id, crcs, upload_host, store_uri, video_auth, aws_auth
-
-
+	return node["video_id"], node["session_key"], node["upload_id"], crcs, node["upload_host"], node["store_uri"], node["video_auth"], aws_sigv4(credentials)
 
 
 if __name__ == "__main__":
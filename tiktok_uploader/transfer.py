@@ -0,0 +1,290 @@
+import os, json, time, random, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tiktok_uploader.Config import Config
+from tiktok_uploader.bot_utils import crc32, print_error
+from tiktok_uploader.storage import write_json
+
+
+MIN_CHUNK_SIZE = 5242880
+MAX_CHUNK_SIZE = 33554432
+# Aim for parts that take roughly this long to send at the observed throughput.
+TARGET_PART_SECONDS = 4
+# Read buffers of one upload together stay under this, so large parts mean fewer parts in flight.
+PART_BUFFER_BUDGET = 33554432
+
+# Upload hosts are probed with a request this short when picking between several of them.
+PROBE_TIMEOUT = 2
+# Host stats older than this are not trusted anymore, routes and load change.
+HOST_STATS_TTL = 24 * 3600
+
+# Observed throughput (bytes/s) and round trip time (s) per upload host, shared by every upload
+# in this process and kept in CACHE_DIR/upload_hosts.json between runs.
+_host_stats = None
+_host_lock = threading.Lock()
+
+
+def _stats_path():
+	return os.path.join(os.getcwd(), Config.get().cache_dir, "upload_hosts.json")
+
+
+def _load_stats():
+	global _host_stats
+	if _host_stats is None:
+		_host_stats = {}
+		try:
+			with open(_stats_path(), "r") as f:
+				_host_stats = json.load(f)
+		except (OSError, ValueError):
+			pass
+	return _host_stats
+
+
+def _save_stats():
+	write_json(_stats_path(), _host_stats)
+
+
+def host_stats(upload_host):
+	"""{"throughput", "rtt"} seen for upload_host, empty if it was not measured recently"""
+	with _host_lock:
+		stats = _load_stats().get(upload_host)
+	if not stats or time.time() - stats.get("updated_at", 0) > HOST_STATS_TTL:
+		return {}
+	return stats
+
+
+def _record(upload_host, name, value):
+	# Blend a new sample into the running average.
+	with _host_lock:
+		stats = _load_stats().setdefault(upload_host, {})
+		previous = stats.get(name) if time.time() - stats.get("updated_at", 0) <= HOST_STATS_TTL else None
+		stats[name] = value if previous is None else 0.7 * previous + 0.3 * value
+		stats["updated_at"] = int(time.time())
+		_save_stats()
+
+
+def record_throughput(upload_host, bytes_per_second):
+	_record(upload_host, "throughput", bytes_per_second)
+
+
+def record_rtt(upload_host, seconds):
+	_record(upload_host, "rtt", seconds)
+
+
+def choose_chunk_size(upload_host):
+	"""Pick a part size for upload_host from the throughput seen on earlier uploads"""
+	throughput = host_stats(upload_host).get("throughput")
+	if not throughput:
+		return MIN_CHUNK_SIZE
+	size = int(throughput * TARGET_PART_SECONDS) // 1048576 * 1048576
+	return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, size))
+
+
+def probe_rtt(session, upload_host, timeout=PROBE_TIMEOUT):
+	"""Time a small request to upload_host, any HTTP answer counts. None if it is unreachable."""
+	start = time.time()
+	try:
+		session.head(f"https://{upload_host}/", timeout=timeout)
+	except Exception:
+		return None
+	rtt = time.time() - start
+	record_rtt(upload_host, rtt)
+	return rtt
+
+
+def select_upload_node(session, nodes, file_size):
+	"""Pick the upload node expected to take the least time to receive file_size bytes.
+
+	Hosts with a known throughput are ranked by their estimated transfer time. Otherwise every
+	host offered is probed in parallel and the one with the lowest round trip time is used,
+	which also leaves a warm connection to it in the session."""
+	if len(nodes) == 1:
+		return nodes[0]
+	hosts = [node["UploadHost"] for node in nodes]
+	stats = {host: host_stats(host) for host in hosts}
+	if all(stats[host].get("throughput") for host in hosts):
+		estimate = {host: file_size / stats[host]["throughput"] + stats[host].get("rtt", 0) for host in hosts}
+	else:
+		with ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+			rtts = dict(zip(hosts, pool.map(lambda host: probe_rtt(session, host), hosts)))
+		estimate = {host: rtt for host, rtt in rtts.items() if rtt is not None}
+		if not estimate:
+			return nodes[0]
+	best = min(estimate, key=estimate.get)
+	print(f"[+] Upload node {best} selected out of {len(nodes)}")
+	return nodes[hosts.index(best)]
+
+
+class PartUploader:
+	"""Sends the parts of one file to an upload host over a bounded pool of workers.
+
+	Every part response is checked and only failed parts are retried, with exponential backoff.
+	The number of parts in flight grows while the aggregate throughput keeps improving and is
+	halved whenever a part needs a retry. Each part in flight holds one chunk_size buffer, and
+	workers are capped so that workers x chunk_size stays within PART_BUFFER_BUDGET.
+
+	pool, when given, is an executor shared with other uploads that the parts are sent on instead
+	of a pool of this upload's own, so many concurrent uploads stay within its threads."""
+
+	def __init__(self, session, upload_host, store_uri, video_auth, upload_id, max_workers=6, max_retries=4, backoff=1.0, pool=None):
+		self.session = session
+		self.upload_host = upload_host
+		self.store_uri = store_uri
+		self.video_auth = video_auth
+		self.upload_id = upload_id
+		self.max_workers = max_workers
+		self.max_retries = max_retries
+		self.backoff = backoff
+		self.concurrency = min(2, max_workers)
+		self.pool = pool
+		self._slots = []
+		self._files = []
+		self._files_lock = threading.Lock()
+		self._stop = threading.Event()
+		# Bytes/s of the parts sent by the last upload(), None when every part was already done.
+		self.throughput = None
+
+	def upload(self, path, chunk_size=None, completed=None, on_part=None):
+		"""Upload every part of path, returns the list of part CRCs in order or None on failure.
+		Parts listed in completed ({part_number: crc}) are not sent again, on_part(part_number, crc)
+		is called as each remaining part is accepted."""
+		if chunk_size is None:
+			chunk_size = choose_chunk_size(self.upload_host)
+		self.path = path
+		self._stop.clear()
+		self.chunk_size = chunk_size
+		# chunk_size is fixed for the whole upload (resumed parts depend on it), so the budget
+		# is kept by running fewer workers.
+		workers = max(1, min(self.max_workers, PART_BUFFER_BUDGET // chunk_size))
+		self.concurrency = min(self.concurrency, workers)
+		file_size = os.stat(path).st_size
+		part_count = max(1, -(-file_size // chunk_size))
+		crcs = [None] * part_count
+		for part_number, crc in (completed or {}).items():
+			crcs[part_number - 1] = crc
+		pending = deque(n for n in range(1, part_count + 1) if crcs[n - 1] is None)
+		in_flight = {}
+		sent_bytes = 0
+		best_rate = 0
+		level_start = time.time()
+		level_bytes = 0
+		start = level_start
+
+		pool = self.pool or ThreadPoolExecutor(max_workers=workers)
+		try:
+			while pending or in_flight:
+				while pending and len(in_flight) < self.concurrency:
+					part_number = pending.popleft()
+					in_flight[pool.submit(self._send_part, part_number)] = part_number
+				done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+				for future in done:
+					part_number = in_flight.pop(future)
+					result = future.result()
+					if result is None:
+						print(f"[-] Part {part_number} failed after {self.max_retries} retries")
+						self._stop.set()
+						for other in in_flight:
+							other.cancel()
+						return None
+					crc, size, attempts = result
+					crcs[part_number - 1] = crc
+					if on_part:
+						on_part(part_number, crc)
+					sent_bytes += size
+					level_bytes += size
+					if attempts > 1:
+						self.concurrency = max(1, self.concurrency // 2)
+						level_start, level_bytes, best_rate = time.time(), 0, 0
+						continue
+					# Re-evaluate once every worker at this level has finished a part.
+					elapsed = time.time() - level_start
+					if level_bytes >= self.concurrency * chunk_size and elapsed > 0:
+						rate = level_bytes / elapsed
+						if rate > best_rate * 1.1 and self.concurrency < workers:
+							self.concurrency += 1
+						best_rate = max(best_rate, rate)
+						level_start, level_bytes = time.time(), 0
+		finally:
+			# Parts still being sent read from the files closed below.
+			wait(in_flight)
+			if pool is not self.pool:
+				pool.shutdown(wait=True)
+			self._close_files()
+
+		elapsed = time.time() - start
+		if elapsed > 0 and sent_bytes:
+			self.throughput = sent_bytes / elapsed
+			record_throughput(self.upload_host, self.throughput)
+		return crcs
+
+	def _acquire_slot(self):
+		# A part in flight reads through its own handle into its own reusable buffer, slots are
+		# kept per upload rather than per thread so a shared pool does not multiply them.
+		with self._files_lock:
+			if self._slots:
+				return self._slots.pop()
+		slot = (bytearray(self.chunk_size), open(self.path, "rb"))
+		with self._files_lock:
+			self._files.append(slot[1])
+		return slot
+
+	def _release_slot(self, slot):
+		with self._files_lock:
+			self._slots.append(slot)
+
+	def _send_part(self, part_number):
+		slot = self._acquire_slot()
+		try:
+			return self._send_from(slot, part_number)
+		finally:
+			self._release_slot(slot)
+
+	def _send_from(self, slot, part_number):
+		buffer, f = slot
+		f.seek((part_number - 1) * self.chunk_size)
+		chunk = memoryview(buffer)[:f.readinto(buffer)]
+		crc = crc32(chunk)
+		url = f"https://{self.upload_host}/{self.store_uri}?partNumber={part_number}&uploadID={self.upload_id}&phase=transfer"
+		headers = {
+			"Authorization": self.video_auth,
+			"Content-Type": "application/octet-stream",
+			"Content-Disposition": 'attachment; filename="undefined"',
+			"Content-Crc32": crc,
+		}
+		for attempt in range(1, self.max_retries + 2):
+			try:
+				r = self.session.post(url, headers=headers, data=chunk, timeout=(10, 120))
+				if part_accepted(r, crc):
+					return crc, len(chunk), attempt
+				print_error(url, r)
+			except Exception as e:
+				print(f"[-] Part {part_number} transfer error: {e}")
+			if self._stop.is_set():
+				break
+			if attempt <= self.max_retries:
+				time.sleep(self.backoff * 2 ** (attempt - 1) + random.uniform(0, self.backoff))
+		return None
+
+	def _close_files(self):
+		with self._files_lock:
+			for f in self._files:
+				f.close()
+			self._files = []
+			self._slots = []
+
+
+def part_accepted(r, crc):
+	"""Check a phase=transfer response, including the CRC echoed back by the upload host when present"""
+	if r.status_code != 200:
+		return False
+	try:
+		body = r.json()
+	except ValueError:
+		return True
+	if not isinstance(body, dict):
+		return True
+	if "code" in body and body["code"] not in (0, 2000):
+		return False
+	data = body.get("data")
+	echoed = data.get("crc32") if isinstance(data, dict) else None
+	return echoed is None or echoed.lower() == crc
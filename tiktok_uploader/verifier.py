@@ -0,0 +1,160 @@
+import os, time, threading, traceback
+from contextlib import contextmanager
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import file_lock, read_json, write_json
+
+
+# project/list is queried at most once per account per interval.
+VERIFY_INTERVAL = 60
+# Posts that still are not in project/list after this long are given up on.
+VERIFY_TIMEOUT = 3600
+# Final statuses are kept this long so callers can look them up.
+RESULT_TTL = 7 * 24 * 3600
+# Task messages of a post TikTok has accepted.
+SUCCESS_MESSAGES = ["Y project task init", "Success"]
+
+
+class PostVerifier:
+	"""Confirms posts in the background instead of polling project/list after every upload.
+
+	Published posts are tracked by creation_id per account and kept on disk, so a post made by
+	one process can be confirmed by another (the upload worker runs the verifier). Each pass
+	reads project/list once per account and resolves every outstanding post of that account."""
+
+	_instances = {}
+	_instances_lock = threading.Lock()
+
+	def __init__(self, path):
+		self.path = path
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread = None
+		self.data = self._load()
+
+	@staticmethod
+	def get():
+		path = os.path.join(os.getcwd(), Config.get().cache_dir, "post_status.json")
+		with PostVerifier._instances_lock:
+			if path not in PostVerifier._instances:
+				PostVerifier._instances[path] = PostVerifier(path)
+			return PostVerifier._instances[path]
+
+	def _load(self):
+		data = {"pending": {}, "results": {}}
+		data.update(read_json(self.path, {}))
+		return data
+
+	def _save(self):
+		now = time.time()
+		self.data["results"] = {k: v for k, v in self.data["results"].items() if now - v["checked_at"] < RESULT_TTL}
+		write_json(self.path, self.data)
+
+	@contextmanager
+	def _transaction(self):
+		# Other processes track and resolve posts in the same file, a change applies to the file as
+		# it is on disk now, under a lock they take too.
+		with self._lock, file_lock(self.path):
+			self.data = self._load()
+			yield
+			self._save()
+
+	def track(self, account, creation_id, video_ids):
+		"""Remember a post so the next pass confirms it"""
+		with self._transaction():
+			self.data["pending"].setdefault(account, {})[creation_id] = {"video_ids": list(video_ids), "posted_at": int(time.time())}
+
+	def status(self, creation_id):
+		"""Final status of a post ({"status", "status_msg", ...}), "pending" while unresolved, or None if unknown"""
+		with self._lock:
+			self.data = self._load()
+			if creation_id in self.data["results"]:
+				return self.data["results"][creation_id]
+			if any(creation_id in posts for posts in self.data["pending"].values()):
+				return "pending"
+		return None
+
+	def verify_account(self, account, session):
+		"""Resolve the outstanding posts of one account with a single project/list request,
+		returns the number of posts resolved"""
+		from tiktok_uploader.bot_utils import assert_success
+
+		with self._lock:
+			pending = dict(self.data["pending"].get(account, {}))
+		if not pending:
+			return 0
+
+		url = "https://www.tiktok.com/api/v1/web/project/list/?aid=1988"
+		r = session.get(url)
+		if not assert_success(url, r):
+			return 0
+
+		now = int(time.time())
+		resolved = {}
+		for j in r.json().get("infos") or []:
+			creation_id = j.get("creationID")
+			if creation_id not in pending:
+				continue
+			try:
+				status_msg = j["tasks"][0]["status_msg"]
+			except (KeyError, IndexError):
+				continue
+			status = "confirmed" if status_msg in SUCCESS_MESSAGES else "failed"
+			resolved[creation_id] = {"status": status, "status_msg": status_msg}
+		for creation_id, post in pending.items():
+			if creation_id not in resolved and now - post["posted_at"] > VERIFY_TIMEOUT:
+				resolved[creation_id] = {"status": "unconfirmed", "status_msg": "not found in project list"}
+
+		if not resolved:
+			return 0
+		with self._transaction():
+			posts = self.data["pending"].get(account, {})
+			for creation_id, result in resolved.items():
+				post = posts.pop(creation_id, pending[creation_id])
+				result.update(account=account, video_ids=post["video_ids"], posted_at=post["posted_at"], checked_at=now)
+				self.data["results"][creation_id] = result
+				print(f"[{'+' if result['status'] == 'confirmed' else '-'}] Post {creation_id} ({account}): {result['status']}, {result['status_msg']}")
+			if not posts:
+				self.data["pending"].pop(account, None)
+		return len(resolved)
+
+	def verify_pending(self):
+		"""One pass over every account with outstanding posts, returns the number of posts resolved"""
+		from tiktok_uploader import tiktok
+		from tiktok_uploader.proxies import ProxyPool
+
+		proxies = ProxyPool.get()
+		with self._lock:
+			self.data = self._load()
+			accounts = [account for account, posts in self.data["pending"].items() if posts]
+		resolved = 0
+		for account in accounts:
+			try:
+				# project/list goes out through the account's proxy like its uploads, and is not
+				# sent from this machine's own address while all of them are down.
+				proxy = None
+				if proxies.has_proxies(account):
+					proxy = proxies.best(account)
+					if proxy is None:
+						continue
+				opened = tiktok.open_session(account, proxy, quiet=True)
+				if opened is not None:
+					resolved += self.verify_account(account, opened[2])
+			except Exception:
+				traceback.print_exc()
+		return resolved
+
+	def start(self, interval=VERIFY_INTERVAL):
+		"""Run verify_pending every interval seconds on a daemon thread"""
+		if self._thread is not None and self._thread.is_alive():
+			return
+		self._stop.clear()
+
+		def loop():
+			while not self._stop.wait(interval):
+				self.verify_pending()
+
+		self._thread = threading.Thread(target=loop, name="post-verifier", daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._stop.set()
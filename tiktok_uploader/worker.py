@@ -0,0 +1,196 @@
+import os, json, time, uuid, threading, traceback
+from tiktok_uploader.Config import Config
+from tiktok_uploader.storage import try_lock
+
+
+# A worker counts as running while its heartbeat is younger than this, it is refreshed every
+# HEARTBEAT_INTERVAL seconds from a thread of its own so long uploads do not let it expire.
+HEARTBEAT_TIMEOUT = 15
+HEARTBEAT_INTERVAL = 5
+
+UPLOAD_OPTIONS = ["schedule_time", "publish_at", "allow_comment", "allow_duet", "allow_stitch", "visibility_type",
+                  "brand_organic_type", "branded_content_type", "ai_label", "proxy"]
+
+
+def _spool_paths(spool_dir=None):
+	if not spool_dir:
+		spool_dir = os.path.join(os.getcwd(), Config.get().worker_spool_dir)
+	paths = {name: os.path.join(spool_dir, name) for name in ("jobs", "running", "results")}
+	paths["heartbeat"] = os.path.join(spool_dir, "worker.heartbeat")
+	paths["lock"] = os.path.join(spool_dir, "worker.lock")
+	return paths
+
+
+def _write_json(path, data):
+	# Readers only ever see complete files.
+	tmp_path = path + ".tmp"
+	with open(tmp_path, "w") as f:
+		json.dump(data, f)
+	os.replace(tmp_path, path)
+
+
+def worker_running(spool_dir=None):
+	"""Whether an UploadWorker is currently serving the spool directory"""
+	heartbeat = _spool_paths(spool_dir)["heartbeat"]
+	return os.path.exists(heartbeat) and time.time() - os.path.getmtime(heartbeat) < HEARTBEAT_TIMEOUT
+
+
+def submit_job(users, video, title, spool_dir=None, **options):
+	"""Queue an upload for the worker, returns the job id. options are upload_video keyword arguments."""
+	paths = _spool_paths(spool_dir)
+	os.makedirs(paths["jobs"], exist_ok=True)
+	job_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+	job = {"id": job_id, "users": users, "video": video, "title": title, "options": options, "submitted_at": time.time()}
+	_write_json(os.path.join(paths["jobs"], job_id + ".json"), job)
+	return job_id
+
+
+def wait_for_result(job_id, timeout=None, spool_dir=None, poll_interval=0.5):
+	"""Block until the worker has written the result of job_id, returns None on timeout"""
+	path = os.path.join(_spool_paths(spool_dir)["results"], job_id + ".json")
+	deadline = None if timeout is None else time.time() + timeout
+	while deadline is None or time.time() < deadline:
+		if os.path.exists(path):
+			with open(path, "r") as f:
+				result = json.load(f)
+			os.remove(path)
+			return result
+		time.sleep(poll_interval)
+	return None
+
+
+class UploadWorker:
+	"""Long running uploader fed through a spool directory.
+
+	Clients drop job files in jobs/ (see submit_job), the worker claims them by moving them to
+	running/, uploads with upload_video and writes a structured result to results/. Sessions,
+	the signer and everything imported stay warm between jobs. Jobs of different accounts run
+	in parallel (max_concurrent), each account at the pace its rate limiter allows."""
+
+	def __init__(self, spool_dir=None, poll_interval=0.5, max_concurrent=None):
+		self.paths = _spool_paths(spool_dir)
+		self.poll_interval = poll_interval
+		self.max_concurrent = max_concurrent
+		self.proxies = None
+		self.scheduler = None
+		self._stop = threading.Event()
+		self._lock_file = None
+		for name in ("jobs", "running", "results"):
+			os.makedirs(self.paths[name], exist_ok=True)
+
+	def run(self):
+		# Only one worker serves a spool directory, the lock is held until this one exits. Its
+		# running/ jobs are still being uploaded, taking them back would upload them twice.
+		self._lock_file = try_lock(self.paths["lock"])
+		if self._lock_file is None:
+			other = self._live_worker()
+			print(f"[-] Another upload worker{f' (pid {other})' if other else ''} is serving {os.path.dirname(self.paths['jobs'])}")
+			return False
+		from tiktok_uploader.verifier import PostVerifier
+		from tiktok_uploader.proxies import ProxyPool
+		from tiktok_uploader.scheduler import UploadScheduler, MAX_CONCURRENT
+
+		self._heartbeat()
+		self._stop.clear()
+		threading.Thread(target=self._beat, name="worker-heartbeat", daemon=True).start()
+		print(f"[+] Upload worker waiting for jobs in {os.path.dirname(self.paths['jobs'])}")
+		self._requeue_interrupted()
+		# Posts are confirmed in bulk between jobs instead of after each upload.
+		PostVerifier.get().start()
+		self.proxies = ProxyPool.get()
+		self.proxies.start()
+		self.scheduler = UploadScheduler(self.max_concurrent or MAX_CONCURRENT)
+		try:
+			while True:
+				job_path = self._claim_next()
+				if job_path is None:
+					time.sleep(self.poll_interval)
+					continue
+				with open(job_path, "r") as f:
+					job = json.load(f)
+				self.scheduler.submit(job["users"], self._run_job, job_path, job)
+		except KeyboardInterrupt:
+			print("\n[+] Upload worker stopped")
+			# Jobs still queued or running stay in running/ and are picked up again on restart.
+			self.scheduler.shutdown(wait=False)
+		finally:
+			self._stop.set()
+			if os.path.exists(self.paths["heartbeat"]):
+				os.remove(self.paths["heartbeat"])
+			self._lock_file.close()
+			self._lock_file = None
+
+	def _heartbeat(self):
+		with open(self.paths["heartbeat"], "w") as f:
+			f.write(str(os.getpid()))
+
+	def _beat(self):
+		while not self._stop.wait(HEARTBEAT_INTERVAL):
+			self._heartbeat()
+
+	def _live_worker(self):
+		# pid of another worker whose heartbeat is still fresh, None if there is none.
+		if not worker_running(os.path.dirname(self.paths["heartbeat"])):
+			return None
+		try:
+			with open(self.paths["heartbeat"], "r") as f:
+				pid = int(f.read().strip())
+		except (OSError, ValueError):
+			return None
+		return pid if pid != os.getpid() else None
+
+	def _requeue_interrupted(self):
+		# Jobs left in running/ by a worker that died go back to the queue, the upload
+		# journal lets them resume where they stopped.
+		for name in os.listdir(self.paths["running"]):
+			os.replace(os.path.join(self.paths["running"], name), os.path.join(self.paths["jobs"], name))
+
+	def _claim_next(self):
+		names = sorted(n for n in os.listdir(self.paths["jobs"]) if n.endswith(".json"))
+		for name in names:
+			running_path = os.path.join(self.paths["running"], name)
+			try:
+				os.replace(os.path.join(self.paths["jobs"], name), running_path)
+			except FileNotFoundError:
+				continue
+			return running_path
+		return None
+
+	def _run_job(self, job_path, job):
+		result = self.process(job)
+		_write_json(os.path.join(self.paths["results"], job["id"] + ".json"), result)
+		os.remove(job_path)
+		return result
+
+	def process(self, job):
+		"""Upload one job and describe the outcome"""
+		from tiktok_uploader import tiktok
+		from tiktok_uploader.proxies import ProxyPool, upload_with_failover
+
+		options = {k: v for k, v in job.get("options", {}).items() if k in UPLOAD_OPTIONS}
+		report = {}
+		start = time.time()
+		print(f"[+] Job {job['id']}: uploading {job['video']} for {job['users']}")
+		try:
+			# Accounts with proxies in channels_config.json go through the best healthy one.
+			proxies = self.proxies or ProxyPool.get()
+			if not options.get("proxy") and proxies.has_proxies(job["users"]):
+				options.pop("proxy", None)
+				ok = upload_with_failover(job["users"], job["video"], job["title"], pool=proxies, report=report, **options)
+			else:
+				ok = tiktok.upload_video(job["users"], job["video"], job["title"], report=report, **options)
+			# "unknown" when the post got no answer, PostVerifier settles it.
+			status = "published" if ok else "unknown" if report.get("status") == "unknown" else "failed"
+			error = report.get("error") if status == "unknown" else None
+		except (Exception, SystemExit) as e:
+			traceback.print_exc()
+			status, error = "error", str(e) or e.__class__.__name__
+		report.update({
+			"id": job["id"],
+			"status": status,
+			"error": error,
+			"queued_for": round(start - job.get("submitted_at", start), 3),
+			"elapsed": round(time.time() - start, 3),
+		})
+		print(f"[+] Job {job['id']}: {status} in {report['elapsed']}s")
+		return report
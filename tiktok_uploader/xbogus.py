@@ -0,0 +1,68 @@
+import base64, hashlib, time
+
+
+# Native port of the X-Bogus computation in tiktok-signature/javascript/xbogus.js.
+# The token is the RC4-obscured, custom-base64 encoding of 19 bytes: md5 digests of the
+# query, the (empty) body and the user agent, a timestamp and two browser fingerprint values.
+
+_ALPHABET = "Dkdpgh4ZKsQB80/Mfvw36XI1R25-WUAlEi7NLboqYTOPuzmFjJnryx9HVGcaStCe="
+
+# Values a desktop Chrome page feeds into the token. xbogus.js starts envcode at 0 and only the
+# webmssdk VM running in a real page fills it and the canvas fingerprint in, so both come out as
+# zero under node (see tests/test_xbogus.py). They were read back from X-Bogus tokens the web
+# uploader sends: undoing the custom base64 and the RC4 pass (key 0xff) gives the 19 bytes built
+# in generate_x_bogus, where bytes 2-3 are the environment code and 14-17 the canvas value. The
+# public Python ports of X-Bogus for TikTok web use the same two values.
+ENV_CODE = (1, 12)
+CANVAS_FINGERPRINT = 536919696
+
+
+def _rc4(key, data):
+	s = list(range(256))
+	j = 0
+	for i in range(256):
+		j = (j + s[i] + key[i % len(key)]) % 256
+		s[i], s[j] = s[j], s[i]
+	out = bytearray()
+	i = j = 0
+	for byte in data:
+		i = (i + 1) % 256
+		j = (j + s[i]) % 256
+		s[i], s[j] = s[j], s[i]
+		out.append(byte ^ s[(s[i] + s[j]) % 256])
+	return bytes(out)
+
+
+def _md5(data):
+	return hashlib.md5(data).digest()
+
+
+def _encode(data):
+	result = []
+	for i in range(0, len(data), 3):
+		n = (data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+		result.append(_ALPHABET[n >> 18 & 63] + _ALPHABET[n >> 12 & 63] + _ALPHABET[n >> 6 & 63] + _ALPHABET[n & 63])
+	return "".join(result)
+
+
+def generate_x_bogus(query, user_agent, timestamp=None, env_code=ENV_CODE, canvas=CANVAS_FINGERPRINT):
+	"""Compute the X-Bogus value for a url query string signed with user_agent"""
+	if timestamp is None:
+		timestamp = int(time.time())
+	ua_hash = _md5(base64.b64encode(_rc4(bytes([0, env_code[0], env_code[1]]), user_agent.encode("latin-1"))))
+	body_hash = _md5(_md5(b""))
+	query_hash = _md5(_md5(query.encode("utf-8")))
+
+	values = [
+		64, 0, env_code[0], env_code[1],
+		query_hash[14], query_hash[15], body_hash[14], body_hash[15], ua_hash[14], ua_hash[15],
+		timestamp >> 24 & 255, timestamp >> 16 & 255, timestamp >> 8 & 255, timestamp & 255,
+		canvas >> 24 & 255, canvas >> 16 & 255, canvas >> 8 & 255, canvas & 255,
+	]
+	checksum = 0
+	for value in values:
+		checksum ^= value
+	values.append(checksum)
+
+	return _encode(bytes([2, 255]) + _rc4(b"\xff", bytes(values)))
+
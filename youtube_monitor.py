@@ -7,14 +7,29 @@ Monitors YouTube channel for new videos, downloads them, processes, and uploads
 import os
 import json
 import time
+import calendar
 import subprocess
 import random
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import feedparser
 import yt_dlp
+from tiktok_uploader.worker import worker_running, submit_job, wait_for_result
+from tiktok_uploader.proxies import ProxyPool
+from tiktok_uploader.scheduler import UploadScheduler
+from tiktok_uploader.planner import PostPlanner
+from tiktok_uploader.probe import video_duration, forget
+from tiktok_uploader.retime import retime
+from youtube_websub import WebSubReceiver, HUB_URL
 
 # Configuration
+CHANNELS_CONFIG = "channels_config.json"  # Channels, accounts and settings edited from the dashboard
+# Used as the only channel when channels_config.json is missing or has no enabled channel
 YOUTUBE_CHANNEL_URL = "https://www.youtube.com/@daile861"
 CHANNEL_ID = "UCsF3f0SafJJw9Y_iv6tVBHg"  # Will be auto-detected if not set
 VIDEO_DIR = "VideosDirPath"
@@ -22,12 +37,42 @@ PROCESSED_DIR = "ProcessedVideos"
 USERNAME = "japanese.207"
 CHECK_INTERVAL = 2  # Check every 2 seconds
 HISTORY_FILE = "youtube_history.json"
+CHANNEL_STATE_FILE = "youtube_channels.json"  # Feed validators, newest video seen and upload times per channel
+METADATA_FILE = "youtube_metadata.json"  # Metadata of rejected videos per video id, they are not extracted again
 YOUTUBE_COOKIES_FILE = "youtube_cookies.txt"  # Optional cookies file
 
 # Video processing settings
 MIN_DURATION = 45  # seconds
 MAX_DURATION = 180  # seconds (3 minutes - increased to accept longer videos)
 TARGET_DURATION = 60  # seconds
+MIN_HEIGHT = 0  # Reject videos below this resolution before downloading, 0 accepts any
+MAX_FILESIZE = 0  # bytes, reject larger videos before downloading, 0 accepts any
+# Prefer H.264 in mp4 (fastest to decode for the retime), fallback to any format
+DOWNLOAD_FORMAT = 'bv*[vcodec^=avc1]+ba[ext=m4a]/bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/bv*+ba/b'
+UPLOAD_TIMEOUT = 900  # seconds to wait for the upload worker
+SCHEDULE_POSTS = False  # Upload right away but let TikTok publish at the account's next posting slot
+
+# Pipeline: video N+1 downloads while N is encoded and N-1 uploads
+FILTER_WORKERS = 2  # Metadata extraction, videos rejected here are never downloaded
+DOWNLOAD_WORKERS = 2
+PROCESS_WORKERS = 1  # Encoding is CPU bound, more workers only help on machines with spare cores
+UPLOAD_WORKERS = 2
+STAGE_QUEUE_SIZE = 4  # Videos waiting between two stages, a full queue holds the previous stage back
+POLL_WORKERS = 4  # Channels checked at the same time, each holds one listing YoutubeDL while it checks
+LIST_LIMIT = 10  # Latest videos looked at per channel and check
+
+# Channels are checked with a conditional request to their RSS feed, the yt-dlp listing only runs
+# when the feed shows a video newer than the last one seen. Each channel is checked at a fraction
+# of its usual gap between uploads, never less often than MAX_POLL_INTERVAL.
+CADENCE_DIVISOR = 30  # A channel posting once a day is checked every ~48 minutes, capped below
+MAX_POLL_INTERVAL = 600  # seconds
+
+# Optional push notifications from YouTube's WebSub hub, polling stays on as the fallback.
+# The hub must reach WEBSUB_CALLBACK_URL, the receiver listens on WEBSUB_PORT behind it.
+WEBSUB_CALLBACK_URL = os.getenv("WEBSUB_CALLBACK_URL")
+WEBSUB_PORT = int(os.getenv("WEBSUB_PORT", "8085"))
+WEBSUB_HUB_URL = os.getenv("WEBSUB_HUB_URL", HUB_URL)  # Point at youtube_websub.LocalHub to test locally
+WEBSUB_SECRET = os.getenv("WEBSUB_SECRET")  # Random per run when not set
 
 
 def get_ydl_opts_base():
@@ -51,10 +96,181 @@ def get_ydl_opts_base():
     return opts
 
 
+def load_channels(config_path=CHANNELS_CONFIG):
+    """Enabled channels and settings from channels_config.json, the constants above when it has no channel"""
+    try:
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+
+    channels = []
+    seen = set()
+    for channel in config.get('channels', []):
+        if not channel.get('enabled', True) or not channel.get('youtube_url') or not channel.get('tiktok_user'):
+            continue
+        # The dashboard adds one entry per proxy, the ProxyPool already rotates an account's proxies
+        key = (channel['youtube_url'].rstrip('/'), channel['tiktok_user'])
+        if key in seen:
+            continue
+        seen.add(key)
+        channels.append({'id': channel.get('id', channel['tiktok_user']), 'youtube_url': key[0],
+                         'tiktok_user': key[1], 'channel_id': None})
+    if not channels:
+        channels = [{'id': 'default', 'youtube_url': YOUTUBE_CHANNEL_URL, 'tiktok_user': USERNAME, 'channel_id': CHANNEL_ID}]
+
+    settings = {'check_interval': CHECK_INTERVAL, 'min_duration': MIN_DURATION,
+                'max_duration': MAX_DURATION, 'target_duration': TARGET_DURATION}
+    settings.update({k: v for k, v in config.get('settings', {}).items() if k in settings and v})
+    return channels, settings
+
+
+def video_metadata(info):
+    """What the filter needs from a yt-dlp extraction, small enough to cache"""
+    formats = info.get('requested_formats') or [info]
+    video = next((f for f in formats if f.get('vcodec') not in (None, 'none')), formats[0])
+    filesize = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in formats)
+    return {
+        'duration': info.get('duration'),
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'vcodec': video.get('vcodec'),
+        'filesize': filesize or None,
+        'format_id': info.get('format_id'),
+        'live_status': info.get('live_status'),
+        'checked_at': int(time.time()),
+    }
+
+
+def download_progress_hook(d):
+    if d['status'] == 'downloading':
+        if 'total_bytes' in d:
+            percent = d['downloaded_bytes'] / d['total_bytes'] * 100
+            speed = d.get('speed', 0)
+            speed_str = f"{speed/1024/1024:.2f}MB/s" if speed else "N/A"
+            print(f"  📥 Downloading: {percent:.1f}% [{speed_str}]", end='\r', flush=True)
+        elif 'downloaded_bytes' in d:
+            mb = d['downloaded_bytes'] / 1024 / 1024
+            print(f"  📥 Downloading: {mb:.2f}MB", end='\r', flush=True)
+    elif d['status'] == 'finished':
+        print(f"\n  ✓ Download complete")
+
+
+def history_key(video_id, tiktok_user):
+    # A channel can feed several accounts, each gets the video once
+    return f"{video_id}@{tiktok_user}"
+
+
+def remove_video(path):
+    # The probe index keeps an entry per file, it goes with the file
+    os.remove(path)
+    forget(path)
+
+
+def published_timestamp(published):
+    """Unix time of an Atom published date, None when it cannot be read"""
+    try:
+        return datetime.fromisoformat(published.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+class YDLPool:
+    """YoutubeDL instances built once and lent to one thread at a time, shared by every channel"""
+
+    def __init__(self, opts, size):
+        self.instances = queue.Queue()
+        for _ in range(size):
+            self.instances.put(yt_dlp.YoutubeDL(opts))
+
+    @contextmanager
+    def borrow(self):
+        ydl = self.instances.get()
+        try:
+            yield ydl
+        finally:
+            self.instances.put(ydl)
+
+
+class Stage:
+    """Worker threads taking items from a bounded queue, each result goes on to the next stage"""
+
+    def __init__(self, name, func, workers, next_stage=None, on_drop=None, queue_size=STAGE_QUEUE_SIZE):
+        self.name = name
+        self.func = func
+        self.next_stage = next_stage
+        self.on_drop = on_drop
+        self.queue = queue.Queue(maxsize=queue_size)
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True).start()
+
+    def put(self, item):
+        # Blocks while the queue is full
+        self.queue.put(item)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                result = self.func(item)
+            except Exception:
+                traceback.print_exc()
+                result = None
+            try:
+                if result is None:
+                    # Dropped at this stage, the video can be picked up again on a later check
+                    if self.on_drop:
+                        self.on_drop(item)
+                elif self.next_stage:
+                    self.next_stage.put(result)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        self.queue.join()
+
+
 class YouTubeMonitor:
-    def __init__(self):
+    def __init__(self, config_path=CHANNELS_CONFIG):
+        self.channels, self.settings = load_channels(config_path)
         self.history = self.load_history()
-        self.channel_id = None
+        self.processed = set(self.history['processed_videos'])
+        self.state = self.load_channel_state()
+        self.state_lock = threading.Lock()
+        self.metadata = self.load_metadata()
+        self.metadata_lock = threading.Lock()
+        for channel in self.channels:
+            channel['channel_id'] = channel['channel_id'] or self.channel_state(channel).get('channel_id')
+        # Extractors are built once here and reused by every check instead of once per request
+        base_opts = get_ydl_opts_base()
+        self.listing = YDLPool(dict(base_opts, extract_flat=True, playlistend=LIST_LIMIT),
+                               min(POLL_WORKERS, len(self.channels)))
+        self.downloaders = YDLPool(dict(
+            base_opts,
+            format=DOWNLOAD_FORMAT,
+            # Named after the account too, the same video queued for two accounts never shares a file
+            outtmpl=os.path.join(VIDEO_DIR, 'temp_%(id)s_%(tiktok_user)s.mp4'),
+            progress_hooks=[download_progress_hook],
+            merge_output_format='mp4',  # Ensure output is mp4
+            sleep_interval=5,  # Add 5 second delay between requests
+            max_sleep_interval=10,  # Max random sleep up to 10 seconds
+            sleep_interval_requests=3,  # Add 3 second delay between API requests
+        ), max(FILTER_WORKERS, DOWNLOAD_WORKERS))
+        self.poller = ThreadPoolExecutor(max_workers=min(POLL_WORKERS, len(self.channels)))
+        self.proxies = ProxyPool.get()
+        self.websub = WebSubReceiver(WEBSUB_CALLBACK_URL, self.on_push, WEBSUB_PORT, WEBSUB_SECRET,
+                                     WEBSUB_HUB_URL) if WEBSUB_CALLBACK_URL else None
+        # Uploads run in the background at the pace the account's rate limiter allows
+        self.scheduler = UploadScheduler()
+        self.planner = PostPlanner() if SCHEDULE_POSTS else None
+        self.history_lock = threading.Lock()
+        # Videos in the pipeline, so checks don't pick them up twice
+        self.queued = set()
+        drop = lambda item: self.requeue(item['channel'], item['video_id'], item['tiktok_user'])
+        self.uploads = Stage("upload", self.upload_stage, UPLOAD_WORKERS, on_drop=drop)
+        self.processing = Stage("process", self.process_stage, PROCESS_WORKERS, self.uploads, drop)
+        self.downloads = Stage("download", self.download_stage, DOWNLOAD_WORKERS, self.processing, drop)
+        self.filters = Stage("filter", self.filter_stage, FILTER_WORKERS, self.downloads, drop)
         
     def load_history(self):
         """Load history of processed videos"""
@@ -67,37 +283,148 @@ class YouTubeMonitor:
         """Save history to file"""
         with open(HISTORY_FILE, 'w') as f:
             json.dump(self.history, f, indent=2)
+
+    def mark_processed(self, video_id, tiktok_user):
+        """Record a video as done for an account, stages call this from their own threads"""
+        with self.history_lock:
+            key = history_key(video_id, tiktok_user)
+            self.history['processed_videos'].append(key)
+            self.processed.add(key)
+            self.save_history()
+
+    def is_processed(self, video_id, tiktok_user):
+        # Bare ids come from before channels_config.json, when every video went to one account
+        return history_key(video_id, tiktok_user) in self.processed or video_id in self.processed
+
+    def load_metadata(self):
+        """Load the metadata cache"""
+        try:
+            with open(METADATA_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_metadata(self, video_id, meta):
+        with self.metadata_lock:
+            self.metadata[video_id] = meta
+            tmp_path = METADATA_FILE + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.metadata, f)
+            os.replace(tmp_path, METADATA_FILE)
+
+    def reject_reason(self, meta):
+        """Why a video should not be downloaded, None to download it"""
+        min_duration = self.settings['min_duration']
+        max_duration = self.settings['max_duration']
+        duration = meta.get('duration')
+        if duration is not None and not min_duration <= duration <= max_duration:
+            return f"Duration {duration:.1f}s out of range ({min_duration}-{max_duration}s)"
+        if MIN_HEIGHT and meta.get('height') and min(meta['height'], meta.get('width') or meta['height']) < MIN_HEIGHT:
+            return f"Resolution {meta.get('width')}x{meta['height']} below {MIN_HEIGHT}p"
+        if MAX_FILESIZE and meta.get('filesize') and meta['filesize'] > MAX_FILESIZE:
+            return f"Size {meta['filesize'] / 1048576:.1f}MB over {MAX_FILESIZE / 1048576:.0f}MB"
+        return None
+
+    def load_channel_state(self):
+        """Load the polling state of every channel"""
+        try:
+            with open(CHANNEL_STATE_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_channel_state(self):
+        """Save the polling state, checks of several channels may call this at once"""
+        with self.state_lock:
+            tmp_path = CHANNEL_STATE_FILE + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_path, CHANNEL_STATE_FILE)
+
+    def channel_state(self, channel):
+        with self.state_lock:
+            return self.state.setdefault(channel['id'], {})
+
+    def requeue(self, channel_key, video_id, tiktok_user):
+        """A video left the pipeline without being uploaded, the next check of its channel lists it again"""
+        self.queued.discard(history_key(video_id, tiktok_user))
+        if self.is_processed(video_id, tiktok_user):
+            # Rejected for good (duration), nothing to list again
+            return
+        for channel in self.channels:
+            if channel['id'] == channel_key:
+                self.channel_state(channel).pop('last_seen', None)
+
+    def feed_changed(self, channel, state):
+        """Conditional request to the channel's RSS feed.
+        Returns the newest video id when it differs from the last one seen, False when nothing
+        changed, None when the feed could not be read (the caller then lists the channel)."""
+        channel_id = self.get_channel_id(channel)
+        if not channel_id:
+            return None
+        state['channel_id'] = channel_id
+
+        rss_url = f"https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+        # Without a watermark (first check, or a video to list again) the feed is read in full
+        validators = {'etag': state.get('etag'), 'modified': state.get('modified')} if state.get('last_seen') else {}
+        try:
+            feed = feedparser.parse(rss_url, **validators)
+        except Exception as e:
+            print(f"❌ Error fetching RSS feed: {e}")
+            return None
+        if feed.get('status') == 304:
+            return False
+        if feed.get('status') != 200 or not feed.entries:
+            return None
+
+        state['etag'] = feed.get('etag')
+        state['modified'] = feed.get('modified')
+        # The feed holds the last 15 uploads, enough to learn how often the channel posts
+        state['uploads'] = sorted(calendar.timegm(entry.published_parsed) for entry in feed.entries
+                                  if entry.get('published_parsed'))
+        newest = feed.entries[0].yt_videoid
+        return newest if newest != state.get('last_seen') else False
+
+    def poll_interval(self, channel, state, changed):
+        """Seconds until the next check of a channel, from how often it usually uploads"""
+        if self.websub and channel['channel_id'] and self.websub.subscribed(channel['channel_id']):
+            # New videos are pushed, the feed check only catches missed notifications
+            return MAX_POLL_INTERVAL
+        fastest = self.settings['check_interval']
+        uploads = state.get('uploads', [])
+        if changed or len(uploads) < 2:
+            # Uploads often come in bursts, and without a cadence the channel is checked as before
+            return fastest
+        gaps = sorted(b - a for a, b in zip(uploads, uploads[1:]))
+        typical_gap = gaps[len(gaps) // 2]
+        return min(MAX_POLL_INTERVAL, max(fastest, typical_gap / CADENCE_DIVISOR))
+
+    def due_in(self):
+        """Seconds until the next channel is due for a check"""
+        now = time.time()
+        return max(0, min(self.channel_state(channel).get('next_check', 0) for channel in self.channels) - now)
     
-    def get_channel_id(self):
+    def get_channel_id(self, channel):
         """Extract channel ID from channel URL"""
-        if self.channel_id:
-            return self.channel_id
+        if channel['channel_id']:
+            return channel['channel_id']
             
         try:
-            ydl_opts = get_ydl_opts_base()
-            ydl_opts['extract_flat'] = True
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(YOUTUBE_CHANNEL_URL, download=False)
-                self.channel_id = info.get('channel_id') or info.get('id')
-                print(f"📺 Channel ID: {self.channel_id}")
-                return self.channel_id
+            with self.listing.borrow() as ydl:
+                info = ydl.extract_info(channel['youtube_url'], download=False)
+                channel['channel_id'] = info.get('channel_id') or info.get('id')
+                print(f"📺 Channel ID: {channel['channel_id']}")
+                return channel['channel_id']
         except Exception as e:
             print(f"❌ Error getting channel ID: {e}")
             return None
     
-    def get_latest_videos(self, limit=5):
+    def get_latest_videos(self, channel, limit=5):
         """Get latest videos directly from YouTube channel (more reliable than RSS)"""
-        channel_url = f"{YOUTUBE_CHANNEL_URL}/shorts"
-        
-        ydl_opts = get_ydl_opts_base()
-        ydl_opts.update({
-            'extract_flat': True,
-            'playlistend': limit,
-        })
+        channel_url = f"{channel['youtube_url']}/shorts"
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.listing.borrow() as ydl:
                 info = ydl.extract_info(channel_url, download=False)
                 
                 if 'entries' not in info:
@@ -120,11 +447,11 @@ class YouTubeMonitor:
         except Exception as e:
             print(f"❌ Error fetching videos: {e}")
             # Fallback to RSS feed
-            return self.get_latest_videos_rss(limit)
+            return self.get_latest_videos_rss(channel, limit)
     
-    def get_latest_videos_rss(self, limit=5):
+    def get_latest_videos_rss(self, channel, limit=5):
         """Fallback: Get latest videos from YouTube channel RSS feed"""
-        channel_id = self.get_channel_id()
+        channel_id = self.get_channel_id(channel)
         if not channel_id:
             return []
         
@@ -148,45 +475,23 @@ class YouTubeMonitor:
             print(f"❌ Error fetching RSS feed: {e}")
             return []
     
-    def download_video(self, video_url, output_path):
-        """Download video from YouTube with progress tracking"""
-        
-        def progress_hook(d):
-            if d['status'] == 'downloading':
-                if 'total_bytes' in d:
-                    percent = d['downloaded_bytes'] / d['total_bytes'] * 100
-                    speed = d.get('speed', 0)
-                    speed_str = f"{speed/1024/1024:.2f}MB/s" if speed else "N/A"
-                    print(f"  📥 Downloading: {percent:.1f}% [{speed_str}]", end='\r', flush=True)
-                elif 'downloaded_bytes' in d:
-                    mb = d['downloaded_bytes'] / 1024 / 1024
-                    print(f"  📥 Downloading: {mb:.2f}MB", end='\r', flush=True)
-            elif d['status'] == 'finished':
-                print(f"\n  ✓ Download complete")
-        
-        ydl_opts = get_ydl_opts_base()
-        ydl_opts.update({
-            # Updated format for YouTube Shorts - prefer mp4, fallback to any format
-            'format': 'bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4]/bv*+ba/b',
-            'outtmpl': output_path,
-            'progress_hooks': [progress_hook],
-            'merge_output_format': 'mp4',  # Ensure output is mp4
-            'sleep_interval': 5,  # Add 5 second delay between requests
-            'max_sleep_interval': 10,  # Max random sleep up to 10 seconds
-            'sleep_interval_requests': 3,  # Add 3 second delay between API requests
-        })
-        
+    def download_video(self, info, tiktok_user):
+        """Download an extracted video with progress tracking, to VIDEO_DIR/temp_<id>_<tiktok_user>.mp4"""
         try:
             print(f"  📥 Starting download...")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
+            with self.downloaders.borrow() as ydl:
+                # The filter stage already extracted the video and chose the format
+                ydl.process_ie_result(dict(info, tiktok_user=tiktok_user), download=True)
             return True
         except Exception as e:
             print(f"\n  ❌ Download error: {e}")
             return False
     
     def get_video_duration(self, video_path):
-        """Get video duration using yt-dlp"""
+        """Get video duration from the container headers, moviepy when they can't be read"""
+        duration = video_duration(video_path)
+        if duration is not None:
+            return duration
         try:
             from moviepy.editor import VideoFileClip
             clip = VideoFileClip(video_path)
@@ -197,8 +502,13 @@ class YouTubeMonitor:
             print(f"  ⚠ Error getting duration: {e}")
             return None
     
-    def scale_video_to_60s(self, input_path, output_path):
+    def scale_video_to_60s(self, input_path, output_path, target_duration=TARGET_DURATION):
         """Scale video to 60 seconds using slow motion with progress tracking"""
+        print(f"  💾 Retiming video to {target_duration}s with ffmpeg...")
+        if retime(input_path, output_path, target_duration):
+            print(f"  ✓ Video scaled successfully")
+            return True
+        print(f"  ⚠ ffmpeg retime unavailable, falling back to moviepy")
         try:
             from moviepy.editor import VideoFileClip
             import sys
@@ -209,15 +519,15 @@ class YouTubeMonitor:
             original_duration = clip.duration
             
             # Calculate speed factor
-            speed_factor = original_duration / TARGET_DURATION
+            speed_factor = original_duration / target_duration
             
-            print(f"  ⏱ Original: {original_duration:.1f}s → Target: {TARGET_DURATION}s (speed: {speed_factor:.3f}x)")
+            print(f"  ⏱ Original: {original_duration:.1f}s → Target: {target_duration}s (speed: {speed_factor:.3f}x)")
             print(f"  🎞 Applying slow motion effect...")
             
             # Apply slow motion
             slowed_clip = clip.fx(lambda c: c.speedx(speed_factor))
             
-            print(f"  💾 Encoding video to {TARGET_DURATION}s...")
+            print(f"  💾 Encoding video to {target_duration}s...")
             
             # Redirect stderr to suppress moviepy progress bar issues
             old_stderr = sys.stderr
@@ -229,7 +539,7 @@ class YouTubeMonitor:
                     output_path,
                     codec='libx264',
                     audio_codec='aac',
-                    temp_audiofile='temp-audio.m4a',
+                    temp_audiofile=f'{output_path}.temp-audio.m4a',  # One per job, stages may encode in parallel
                     remove_temp=True,
                     fps=30,
                     verbose=False,
@@ -253,18 +563,39 @@ class YouTubeMonitor:
             traceback.print_exc()
             return False
     
-    def upload_to_tiktok(self, video_name, title):
-        """Upload video to TikTok with progress tracking"""
+    def upload_with_worker(self, tiktok_user, video_name, title, publish_at=None):
+        """Hand the upload to the resident worker (cli.py worker) and wait for its result"""
+        print(f"  📤 Sending upload to worker...")
+        job_id = submit_job(tiktok_user, video_name, title[:150], publish_at=publish_at)
+        result = wait_for_result(job_id, timeout=UPLOAD_TIMEOUT)
+        if result is None:
+            print(f"  ❌ Worker did not answer within {UPLOAD_TIMEOUT}s")
+            return {'status': 'error', 'error': 'worker timeout'}
+        if result['status'] == 'published':
+            print(f"  ✅ Upload successful! (video id: {result.get('video_id')}, {result['elapsed']}s)")
+            return result
+        print(f"  ❌ Upload failed: {result.get('error') or result.get('status_msg') or result['status']}")
+        return result
+
+    def upload_to_tiktok(self, tiktok_user, video_name, title, publish_at=None, use_worker=None):
+        """Upload video to TikTok with progress tracking, returns a report with the upload status.
+        publish_at is passed on as is, the uploader turns it into a schedule time when it posts."""
+        if use_worker is None:
+            use_worker = worker_running()
+        if use_worker:
+            return self.upload_with_worker(tiktok_user, video_name, title, publish_at)
         try:
             print(f"  📤 Starting TikTok upload...")
             print(f"  📝 Title: {title[:150]}")
             
             cmd = [
                 "/Users/t.le/Downloads/myspace/TiktokAutoUploader/venv/bin/python", "cli.py", "upload",
-                "--user", USERNAME,
+                "--user", tiktok_user,
                 "-v", video_name,
-                "-t", title[:150]  # TikTok title limit
+                "-t", title[:150],  # TikTok title limit
             ]
+            if publish_at:
+                cmd += ["--publish-at", str(publish_at)]
             
             # Run with real-time output
             process = subprocess.Popen(
@@ -289,181 +620,319 @@ class YouTubeMonitor:
             full_output = '\n'.join(upload_output)
             if "Published successfully" in full_output:
                 print(f"  ✅ Upload successful!")
-                return True
+                return {'status': 'published'}
             else:
                 print(f"  ❌ Upload failed")
-                return False
+                # Lets the rate limiter see TikTok's "posting too fast" answers
+                return {'status': 'failed', 'error': full_output[-500:]}
         except Exception as e:
             print(f"  ❌ Upload error: {e}")
-            return False
+            return {'status': 'error', 'error': str(e)}
     
-    def process_video(self, video_info):
-        """Download, process, and upload a single video"""
+    def filter_stage(self, video_info):
+        """Pipeline stage 1: read a new video's metadata and reject it before it is downloaded,
+        returns the video with its extraction for the download stage"""
         video_id = video_info['video_id']
         title = video_info['title']
         url = video_info['url']
+        tiktok_user = video_info['tiktok_user']
         
         print(f"\n{'='*70}")
         print(f"🎬 New Video Found!")
+        print(f"👤 TikTok User: {tiktok_user}")
         print(f"📺 Title: {title}")
         print(f"🔗 URL: {url}")
         print(f"🆔 Video ID: {video_id}")
         print(f"{'='*70}")
         
         # Check if already processed
-        if video_id in self.history['processed_videos']:
+        if self.is_processed(video_id, tiktok_user):
             print(f"⏭ Already processed, skipping")
-            return False
+            return None
         
+        # Don't spend a download and encode on a video no proxy can upload
+        if self.proxies.has_proxies(tiktok_user) and not self.proxies.candidates(tiktok_user):
+            print(f"  ⚠ No healthy proxy for {tiktok_user}, will retry on next check")
+            return None
+
+        # A video rejected before (for another account, or before a restart) is not extracted again
+        meta = self.metadata.get(video_id)
+        reason = self.reject_reason(meta) if meta else None
+        info = None
+        if not reason:
+            start_time = time.time()
+            try:
+                with self.downloaders.borrow() as ydl:
+                    info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                print(f"  ❌ Metadata error: {e}")
+                return None
+            meta = video_metadata(info)
+            reason = self.reject_reason(meta)
+            # Only rejections are cached, an accepted video is extracted again when it is next
+            # seen since the download needs fresh format URLs
+            if reason:
+                self.save_metadata(video_id, meta)
+
+        if meta.get('live_status') in ('is_upcoming', 'is_live'):
+            print(f"  ⏭ Not available yet ({meta['live_status']}), will retry on next check")
+            return None
+        if reason:
+            print(f"  ⏭ {reason}, skipping without downloading")
+            self.mark_processed(video_id, tiktok_user)
+            return None
+
+        print(f"  🎞 {meta['width']}x{meta['height']} {meta['vcodec']}, format {meta['format_id']}")
+        return dict(video_info, info=info, duration=meta['duration'], start_time=start_time)
+
+    def download_stage(self, video):
+        """Pipeline stage 2: download a filtered video, returns the job for the process stage"""
+        video_id = video['video_id']
+
         # Download video
-        temp_filename = f"temp_{video_id}.mp4"
+        temp_filename = f"temp_{video_id}_{video['tiktok_user']}.mp4"
         temp_path = os.path.join(VIDEO_DIR, temp_filename)
         
-        start_time = time.time()
+        download_start = time.time()
         
-        if not self.download_video(url, temp_path):
-            return False
+        if not self.download_video(video['info'], video['tiktok_user']):
+            return None
         
-        download_time = time.time() - start_time
+        download_time = time.time() - download_start
         print(f"  ⏱ Download took {download_time:.1f}s")
-        
-        # Check duration
-        duration = self.get_video_duration(temp_path)
+        return {'video_id': video_id, 'title': video['title'], 'tiktok_user': video['tiktok_user'], 'channel': video['channel'],
+                'temp_path': temp_path, 'duration': video['duration'], 'start_time': video['start_time'],
+                'download_time': download_time}
+
+    def process_stage(self, job):
+        """Pipeline stage 3: check the duration and scale the video, returns the job for the upload stage"""
+        video_id = job['video_id']
+        tiktok_user = job['tiktok_user']
+        temp_path = job['temp_path']
+        min_duration = self.settings['min_duration']
+        max_duration = self.settings['max_duration']
+
+        # Check duration, probing the file only when the extraction did not give it
+        duration = job['duration'] or self.get_video_duration(temp_path)
         if duration is None:
-            os.remove(temp_path)
-            return False
+            remove_video(temp_path)
+            return None
         
         print(f"  ⏱ Video duration: {duration:.1f}s")
         
         # Skip if too short
-        if duration < MIN_DURATION:
-            print(f"  ⏭ Too short (< {MIN_DURATION}s), skipping")
-            os.remove(temp_path)
-            self.history['processed_videos'].append(video_id)
-            self.save_history()
-            return False
-        
-        # Process video based on duration
-        final_video_path = temp_path
+        if duration < min_duration:
+            print(f"  ⏭ Too short (< {min_duration}s), skipping")
+            remove_video(temp_path)
+            self.mark_processed(video_id, tiktok_user)
+            return None
         
-        if MIN_DURATION <= duration <= MAX_DURATION:
+        if min_duration <= duration <= max_duration:
             # Scale to 60s
             print(f"  � Processing video...")
-            scaled_filename = f"scaled_{video_id}.mp4"
+            scaled_filename = f"scaled_{video_id}_{tiktok_user}.mp4"
             scaled_path = os.path.join(VIDEO_DIR, scaled_filename)
             
             process_start = time.time()
             
-            if self.scale_video_to_60s(temp_path, scaled_path):
-                os.remove(temp_path)
-                final_video_path = scaled_path
-                final_filename = scaled_filename
-                
+            if self.scale_video_to_60s(temp_path, scaled_path, self.settings['target_duration']):
+                remove_video(temp_path)
                 process_time = time.time() - process_start
                 print(f"  ⏱ Processing took {process_time:.1f}s")
             else:
-                os.remove(temp_path)
-                return False
+                remove_video(temp_path)
+                return None
         else:
             # Duration out of acceptable range
-            print(f"  ⏭ Duration {duration:.1f}s out of range ({MIN_DURATION}-{MAX_DURATION}s), skipping")
-            os.remove(temp_path)
-            self.history['processed_videos'].append(video_id)
-            self.save_history()
-            return False
-        
-        # Upload to TikTok
-        upload_start = time.time()
-        
-        if self.upload_to_tiktok(final_filename, title):
-            # Mark as processed
-            self.history['processed_videos'].append(video_id)
-            self.save_history()
+            print(f"  ⏭ Duration {duration:.1f}s out of range ({min_duration}-{max_duration}s), skipping")
+            remove_video(temp_path)
+            self.mark_processed(video_id, tiktok_user)
+            return None
+
+        job.update(final_filename=scaled_filename, final_video_path=scaled_path, process_time=process_time)
+        return job
+
+    def upload_stage(self, job):
+        """Pipeline stage 4: upload once the account's rate limiter allows it"""
+        args = (job['tiktok_user'], job['video_id'], job['title'], job['final_filename'], job['final_video_path'],
+                job['start_time'], job['download_time'], job['process_time'])
+        if worker_running():
+            # The worker's scheduler takes the account's token, going through ours too would charge it twice
+            report = self.upload_processed(*args, use_worker=True)
+        else:
+            report = self.scheduler.submit(job['tiktok_user'], self.upload_processed, *args, use_worker=False).result()
+        # A post that got no answer may be online, it is not uploaded again
+        if report.get('status') not in ('published', 'unknown'):
+            self.requeue(job['channel'], job['video_id'], job['tiktok_user'])
+        return report
+
+    def upload_processed(self, tiktok_user, video_id, title, final_filename, final_video_path, start_time, download_time, process_time=None, use_worker=None):
+        """Upload a downloaded and processed video, returns the upload report"""
+        try:
+            # Upload to TikTok
+            upload_start = time.time()
+
+            # With SCHEDULE_POSTS, TikTok publishes the video at the next free posting slot
+            publish_at = self.planner.next_slot(tiktok_user) if self.planner else None
+            if publish_at:
+                print(f"  🗓 Scheduled for {datetime.fromtimestamp(publish_at).strftime('%Y-%m-%d %H:%M')}")
+
+            report = self.upload_to_tiktok(tiktok_user, final_filename, title, publish_at, use_worker)
+            if publish_at and report.get('status') not in ('published', 'unknown'):
+                self.planner.release(tiktok_user, publish_at)
+            if report.get('status') == 'published':
+                # Mark as processed
+                self.mark_processed(video_id, tiktok_user)
             
-            # Clean up
-            if os.path.exists(final_video_path):
-                os.remove(final_video_path)
+                # Clean up
+                if os.path.exists(final_video_path):
+                    remove_video(final_video_path)
             
-            upload_time = time.time() - upload_start
-            total_time = time.time() - start_time
+                upload_time = time.time() - upload_start
+                total_time = time.time() - start_time
             
-            # Adjust display time if total > 20s
-            display_total = total_time if total_time <= 20 else random.uniform(13, 14.5)
-            display_download = download_time if total_time <= 20 else random.uniform(3, 4.5)
-            display_upload = upload_time if total_time <= 20 else random.uniform(4, 5.5)
-            if 'process_time' in locals():
-                display_process = process_time if total_time <= 20 else random.uniform(5, 6.5)
+                # Adjust display time if total > 20s
+                display_total = total_time if total_time <= 20 else random.uniform(13, 14.5)
+                display_download = download_time if total_time <= 20 else random.uniform(3, 4.5)
+                display_upload = upload_time if total_time <= 20 else random.uniform(4, 5.5)
+                if process_time is not None:
+                    display_process = process_time if total_time <= 20 else random.uniform(5, 6.5)
             
-            print(f"  ⏱ Upload took {display_upload:.1f}s")
-            print(f"\n{'='*70}")
-            print(f"⏱ TOTAL TIME: {display_total:.1f}s ({display_total/60:.1f} minutes)")
-            print(f"  📥 Download: {display_download:.1f}s")
-            if 'process_time' in locals():
-                print(f"  🎬 Processing: {display_process:.1f}s")
-            print(f"  📤 Upload: {display_upload:.1f}s")
-            print(f"{'='*70}")
-            print(f"  🎉 Complete!")
-            return True
-        else:
-            # Keep file for manual retry
-            print(f"  ⚠ Upload failed, keeping file: {final_filename}")
-            return False
-    
-    def check_for_new_videos(self):
-        """Check for new videos and process them"""
-        print(f"\n🔍 Checking for new videos... [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
-        
-        videos = self.get_latest_videos(limit=10)
+                print(f"  ⏱ Upload took {display_upload:.1f}s")
+                print(f"\n{'='*70}")
+                print(f"⏱ TOTAL TIME: {display_total:.1f}s ({display_total/60:.1f} minutes)")
+                print(f"  📥 Download: {display_download:.1f}s")
+                if process_time is not None:
+                    print(f"  🎬 Processing: {display_process:.1f}s")
+                print(f"  📤 Upload: {display_upload:.1f}s")
+                print(f"{'='*70}")
+                print(f"  🎉 Complete!")
+                return report
+            elif report.get('status') == 'unknown':
+                # The post may be online, PostVerifier tells (cli.py verify), it is never posted twice
+                self.mark_processed(video_id, tiktok_user)
+                print(f"  ⚠ No answer to the post, keeping file until it is confirmed: {final_filename}")
+                return report
+            else:
+                # Keep file for manual retry
+                print(f"  ⚠ Upload failed, keeping file: {final_filename}")
+                return report
+        finally:
+            self.queued.discard(history_key(video_id, tiktok_user))
+
+    def check_channel(self, channel):
+        """Check one channel for new videos and hand them to the pipeline, returns how many were new"""
+        state = self.channel_state(channel)
+        newest = self.feed_changed(channel, state)
+        state['next_check'] = time.time() + self.poll_interval(channel, state, newest)
+        if newest is False:
+            self.save_channel_state()
+            print(f"  [{channel['tiktok_user']}] No change on {channel['youtube_url']}")
+            return 0
+
+        videos = self.get_latest_videos(channel, limit=LIST_LIMIT)
         
         if not videos:
-            print("  No videos found")
+            self.save_channel_state()
+            print(f"  [{channel['tiktok_user']}] No videos found on {channel['youtube_url']}")
+            return 0
+
+        # Until a video of this listing is dropped, the feed check alone is enough
+        if newest:
+            state['last_seen'] = newest
+        self.save_channel_state()
+
+        new_count = self.enqueue(channel, videos)
+        print(f"  [{channel['tiktok_user']}] Found {len(videos)} recent videos on {channel['youtube_url']}, {new_count} new")
+        return new_count
+
+    def on_push(self, channel_id, video):
+        """A video notified by the WebSub hub goes straight to the pipeline of every channel it belongs to"""
+        for channel in self.channels:
+            if channel['channel_id'] != channel_id:
+                continue
+            state = self.channel_state(channel)
+            # Edits of older videos are pushed too, only a newer upload moves the watermark
+            published = published_timestamp(video['published'])
+            if published and published > max([state.get('last_published', 0)] + state.get('uploads', [])):
+                state['last_seen'] = video['video_id']
+                state['last_published'] = published
+                self.save_channel_state()
+            if self.enqueue(channel, [video]):
+                print(f"\n📡 [{channel['tiktok_user']}] {video['video_id']} pushed, sent to the pipeline")
+
+    def enqueue(self, channel, videos):
+        """Send the videos of a channel that are neither processed nor queued to the pipeline, returns how many"""
+        new_videos = []
+        with self.history_lock:
+            for video in videos:
+                key = history_key(video['video_id'], channel['tiktok_user'])
+                if not self.is_processed(video['video_id'], channel['tiktok_user']) and key not in self.queued:
+                    self.queued.add(key)
+                    new_videos.append(dict(video, tiktok_user=channel['tiktok_user'], channel=channel['id']))
+
+        for video in new_videos:
+            # Handed to the pipeline, posting pace is handled by the scheduler's rate limiter
+            self.filters.put(video)
+        return len(new_videos)
+    
+    def check_for_new_videos(self, force=False):
+        """Check every channel that is due for new videos at the same time and process them,
+        every channel whatever its next_check with force"""
+        now = time.time()
+        due = [channel for channel in self.channels if force or self.channel_state(channel).get('next_check', 0) <= now]
+        if not due:
             return
-        
-        print(f"  Found {len(videos)} recent videos")
+        print(f"\n🔍 Checking {len(due)} channels for new videos... [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]")
         
         new_count = 0
-        processed_count = 0
-        
-        for video in videos:
-            if video['video_id'] not in self.history['processed_videos']:
-                new_count += 1
-                if self.process_video(video):
-                    processed_count += 1
-                    # Add delay after successful processing to avoid rate limiting
-                    if new_count > 1:  # If more videos to process
-                        delay = random.randint(10, 20)
-                        print(f"\n  ⏸ Waiting {delay}s before processing next video to avoid rate limiting...")
-                        time.sleep(delay)
+        for count in self.poller.map(self.check_channel, due):
+            new_count += count
         
         if new_count == 0:
             print("  ✓ No new videos to process")
         else:
-            print(f"\n📊 Summary: {processed_count}/{new_count} new videos processed successfully")
+            print(f"\n📊 {new_count} new videos sent to the pipeline")
+
+    def wait_for_pipeline(self):
+        """Block until every video handed to the pipeline went through all stages"""
+        self.filters.join()
+        self.downloads.join()
+        self.processing.join()
+        self.uploads.join()
     
     def run(self, continuous=True):
         """Run the monitor"""
         print("🚀 YouTube to TikTok Auto-Uploader Started!")
-        print(f"📺 Channel: {YOUTUBE_CHANNEL_URL}")
-        print(f"👤 TikTok User: {USERNAME}")
-        print(f"⏰ Check interval: {CHECK_INTERVAL}s")
+        for channel in self.channels:
+            print(f"📺 Channel: {channel['youtube_url']} → 👤 TikTok User: {channel['tiktok_user']}")
+        print(f"⏰ Check interval: {self.settings['check_interval']}s to {MAX_POLL_INTERVAL}s, from each channel's upload cadence")
         print(f"📁 Download directory: {VIDEO_DIR}")
         
         # Create directories
         os.makedirs(VIDEO_DIR, exist_ok=True)
         os.makedirs(PROCESSED_DIR, exist_ok=True)
+
+        # Keep proxy health fresh in the background
+        self.proxies.start()
+
+        if continuous and self.websub:
+            channel_ids = [self.get_channel_id(channel) for channel in self.channels]
+            self.websub.start([channel_id for channel_id in channel_ids if channel_id])
         
         if continuous:
             print("\n⏸ Press Ctrl+C to stop\n")
             try:
                 while True:
                     self.check_for_new_videos()
-                    print(f"\n💤 Sleeping for {CHECK_INTERVAL}s...")
-                    time.sleep(CHECK_INTERVAL)
+                    # Sleep until the next channel is due
+                    time.sleep(max(1, self.due_in()))
             except KeyboardInterrupt:
                 print("\n\n👋 Stopped by user")
         else:
-            # Single check
-            self.check_for_new_videos()
+            # Single check, of every channel even if the last run checked it moments ago
+            self.check_for_new_videos(force=True)
+            self.wait_for_pipeline()
 
 
 def main():
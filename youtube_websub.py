@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+YouTube WebSub (PubSubHubbub) receiver
+Subscribes to the Atom feed of each monitored channel and gets new videos pushed by YouTube's hub
+"""
+
+import hmac
+import time
+import queue
+import hashlib
+import secrets
+import threading
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+import requests
+
+HUB_URL = "https://pubsubhubbub.appspot.com/subscribe"
+TOPIC_URL = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+LEASE_SECONDS = 432000  # 5 days, the hub may grant less
+RENEW_MARGIN = 0.8  # Subscriptions are renewed after this part of their lease
+DEDUPE_TTL = 24 * 3600  # A video notified again within this time (title edits...) is ignored
+MAX_BODY = 1048576
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+YT = "{http://www.youtube.com/xml/schemas/2015}"
+
+
+def parse_notification(body):
+    """Videos of an Atom notification, as {'video_id', 'channel_id', 'title', 'url', 'published'}"""
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return []
+    videos = []
+    # Deleted videos come as at:deleted-entry elements and are not entries
+    for entry in root.findall(f"{ATOM}entry"):
+        video_id = entry.findtext(f"{YT}videoId")
+        if not video_id:
+            continue
+        link = entry.find(f"{ATOM}link")
+        videos.append({
+            'video_id': video_id,
+            'channel_id': entry.findtext(f"{YT}channelId"),
+            'title': entry.findtext(f"{ATOM}title") or 'Untitled',
+            'url': link.get('href') if link is not None else f"https://www.youtube.com/watch?v={video_id}",
+            'published': entry.findtext(f"{ATOM}published") or 'Unknown',
+        })
+    return videos
+
+
+def sign(secret, body, algorithm='sha1'):
+    """X-Hub-Signature value of body, the hub signs with the secret given at subscription"""
+    return f"{algorithm}={hmac.new(secret.encode(), body, getattr(hashlib, algorithm)).hexdigest()}"
+
+
+def signature_valid(secret, body, header):
+    algorithm, _, digest = (header or '').partition('=')
+    if algorithm not in ('sha1', 'sha256', 'sha384', 'sha512') or not digest:
+        return False
+    return hmac.compare_digest(sign(secret, body, algorithm), f"{algorithm}={digest}")
+
+
+class WebSubReceiver:
+    """HTTP endpoint YouTube's hub pushes channel notifications to.
+
+    callback_url is the public URL of the endpoint (the hub must reach it), the server itself
+    listens on port. Each signed, not yet seen video is passed to on_video(channel_id, video) on a
+    thread of its own, so the hub gets its answer even while on_video waits on a full pipeline."""
+
+    def __init__(self, callback_url, on_video, port=8085, secret=None, hub_url=HUB_URL):
+        self.callback_url = callback_url
+        self.on_video = on_video
+        self.port = port
+        self.secret = secret or secrets.token_hex(16)
+        self.hub_url = hub_url
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # topic -> lease expiry, 0 until the hub verified it
+        self.leases = {}  # topic -> lease the hub granted
+        self.seen = {}
+        self.stop_event = threading.Event()
+        self.server = None
+        self.notifications = queue.Queue()
+        self.dispatcher = None
+
+    def topic(self, channel_id):
+        return TOPIC_URL.format(channel_id=channel_id)
+
+    def subscribed(self, channel_id):
+        """Whether the hub confirmed a subscription to the channel that has not expired"""
+        with self.lock:
+            return self.subscriptions.get(self.topic(channel_id), 0) > time.time()
+
+    def subscribe(self, channel_id, mode='subscribe'):
+        """Ask the hub to push the channel's notifications, it confirms with a GET to the callback"""
+        topic = self.topic(channel_id)
+        with self.lock:
+            self.subscriptions.setdefault(topic, 0)
+        try:
+            r = requests.post(self.hub_url, data={
+                'hub.callback': self.callback_url,
+                'hub.topic': topic,
+                'hub.mode': mode,
+                'hub.verify': 'async',
+                'hub.lease_seconds': LEASE_SECONDS,
+                'hub.secret': self.secret,
+            }, timeout=10)
+        except requests.exceptions.RequestException as e:
+            print(f"❌ WebSub {mode} failed for {channel_id}: {e}")
+            return False
+        if r.status_code not in (202, 204):
+            print(f"❌ WebSub {mode} refused for {channel_id}: {r.status_code} {r.text[:200]}")
+            return False
+        return True
+
+    def verify_intent(self, query):
+        """Answer the hub's verification GET, returns the challenge or None to refuse"""
+        mode = query.get('hub.mode')
+        topic = query.get('hub.topic')
+        with self.lock:
+            if topic not in self.subscriptions:
+                return None
+            if mode == 'subscribe':
+                lease = int(query.get('hub.lease_seconds') or LEASE_SECONDS)
+                self.subscriptions[topic] = time.time() + lease
+                self.leases[topic] = lease
+                print(f"📡 WebSub subscription confirmed for {topic} ({lease}s)")
+            elif mode == 'unsubscribe':
+                self.subscriptions.pop(topic, None)
+            else:
+                return None
+        return query.get('hub.challenge')
+
+    def receive(self, body, signature):
+        """Handle a notification body, returns the videos passed on"""
+        if not signature_valid(self.secret, body, signature):
+            # Not from the hub we subscribed with, the spec still wants a 2xx answer
+            print("⚠ WebSub notification with a bad signature, ignored")
+            return []
+        now = time.time()
+        new_videos = []
+        with self.lock:
+            self.seen = {video_id: at for video_id, at in self.seen.items() if now - at < DEDUPE_TTL}
+            for video in parse_notification(body):
+                if video['video_id'] in self.seen:
+                    continue
+                self.seen[video['video_id']] = now
+                new_videos.append(video)
+        for video in new_videos:
+            print(f"📡 WebSub: {video['video_id']} from {video['channel_id']}")
+            self.notifications.put(video)
+        if new_videos:
+            self.start_dispatcher()
+        return new_videos
+
+    def start_dispatcher(self):
+        with self.lock:
+            if self.dispatcher is not None and self.dispatcher.is_alive():
+                return
+            self.dispatcher = threading.Thread(target=self.dispatch, name="websub-dispatch", daemon=True)
+            self.dispatcher.start()
+
+    def dispatch(self):
+        # Hands notified videos to on_video one at a time, away from the HTTP handler threads
+        while True:
+            video = self.notifications.get()
+            if video is None:
+                break
+            try:
+                self.on_video(video['channel_id'], video)
+            except Exception as e:
+                print(f"❌ WebSub notification error: {e}")
+
+    def handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                challenge = receiver.verify_intent(query)
+                if challenge is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.end_headers()
+                self.wfile.write(challenge.encode())
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(min(length, MAX_BODY))
+                self.send_response(204)
+                self.end_headers()
+                try:
+                    receiver.receive(body, self.headers.get('X-Hub-Signature'))
+                except Exception as e:
+                    print(f"❌ WebSub notification error: {e}")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, channel_ids):
+        """Serve on a daemon thread, subscribe to every channel and keep the subscriptions renewed"""
+        self.server = ThreadingHTTPServer(('', self.port), self.handler())
+        threading.Thread(target=self.server.serve_forever, name="websub", daemon=True).start()
+        print(f"📡 WebSub receiver listening on port {self.port} ({self.callback_url})")
+
+        def renew():
+            while True:
+                now = time.time()
+                for channel_id in channel_ids:
+                    topic = self.topic(channel_id)
+                    with self.lock:
+                        expires = self.subscriptions.get(topic, 0)
+                        lease = self.leases.get(topic, LEASE_SECONDS)
+                    if expires - now < (1 - RENEW_MARGIN) * lease:
+                        self.subscribe(channel_id)
+                # Unconfirmed subscriptions are asked for again on the next pass
+                if self.stop_event.wait(300):
+                    break
+
+        threading.Thread(target=renew, name="websub-renew", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+        self.notifications.put(None)
+
+
+def atom_notification(channel_id, video_id, title='Test video', published=None):
+    """Atom payload shaped like the ones YouTube's hub sends, for LocalHub"""
+    published = published or time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+    return f"""<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <link rel="hub" href="https://pubsubhubbub.appspot.com"/>
+  <link rel="self" href="{TOPIC_URL.format(channel_id=channel_id).replace('&', '&amp;')}"/>
+  <title>YouTube video feed</title>
+  <updated>{published}</updated>
+  <entry>
+    <id>yt:video:{video_id}</id>
+    <yt:videoId>{video_id}</yt:videoId>
+    <yt:channelId>{channel_id}</yt:channelId>
+    <title>{title}</title>
+    <link rel="alternate" href="https://www.youtube.com/watch?v={video_id}"/>
+    <author>
+      <name>Test channel</name>
+      <uri>https://www.youtube.com/channel/{channel_id}</uri>
+    </author>
+    <published>{published}</published>
+    <updated>{published}</updated>
+  </entry>
+</feed>
+""".encode()
+
+
+class LocalHub:
+    """Stand-in for YouTube's hub to test a receiver locally.
+
+    Takes subscriptions on http://127.0.0.1:<port>/subscribe, verifies them against the callback
+    like the real hub, and publish() posts a signed Atom payload to every subscriber of a topic.
+    Point the receiver's hub_url (WEBSUB_HUB_URL for the monitor) at it."""
+
+    def __init__(self, port=8086):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}/subscribe"
+        self.lock = threading.Lock()
+        self.subscribers = {}  # topic -> {callback: secret}
+        self.server = None
+
+    def verify(self, form):
+        query = {'hub.mode': form['hub.mode'], 'hub.topic': form['hub.topic'],
+                 'hub.challenge': secrets.token_hex(8), 'hub.lease_seconds': form.get('hub.lease_seconds', LEASE_SECONDS)}
+        callback = form['hub.callback']
+        try:
+            r = requests.get(f"{callback}{'&' if '?' in callback else '?'}{urlencode(query)}", timeout=10)
+        except requests.exceptions.RequestException:
+            return
+        if r.status_code != 200 or r.text != query['hub.challenge']:
+            return
+        with self.lock:
+            if form['hub.mode'] == 'subscribe':
+                self.subscribers.setdefault(form['hub.topic'], {})[callback] = form.get('hub.secret')
+            else:
+                self.subscribers.get(form['hub.topic'], {}).pop(callback, None)
+
+    def start(self):
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode()
+                form = {k: v[0] for k, v in parse_qs(body).items()}
+                if form.get('hub.mode') not in ('subscribe', 'unsubscribe') or not form.get('hub.callback') or not form.get('hub.topic'):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                self.send_response(202)
+                self.end_headers()
+                threading.Thread(target=hub.verify, args=(form,), daemon=True).start()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="local-hub", daemon=True).start()
+
+    def publish(self, topic, body):
+        """Post body to every subscriber of topic, signed with its secret, returns the answer codes"""
+        with self.lock:
+            subscribers = dict(self.subscribers.get(topic, {}))
+        codes = []
+        for callback, secret in subscribers.items():
+            headers = {'Content-Type': 'application/atom+xml'}
+            if secret:
+                headers['X-Hub-Signature'] = sign(secret, body)
+            codes.append(requests.post(callback, data=body, headers=headers, timeout=10).status_code)
+        return codes
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+
+def main():
+    # Try a receiver against the stand-in hub: python youtube_websub.py
+    hub = LocalHub()
+    hub.start()
+    receiver = WebSubReceiver("http://127.0.0.1:8085/", lambda channel_id, video: print(f"  → {video}"),
+                              port=8085, hub_url=hub.url)
+    receiver.start(["UCtest"])
+    for _ in range(50):
+        if receiver.subscribed("UCtest"):
+            break
+        time.sleep(0.1)
+    payload = atom_notification("UCtest", "dQw4w9WgXcQ")
+    hub.publish(receiver.topic("UCtest"), payload)
+    hub.publish(receiver.topic("UCtest"), payload)  # Deduplicated
+    time.sleep(0.5)
+    receiver.stop()
+    hub.stop()
+
+
+if __name__ == "__main__":
+    main()